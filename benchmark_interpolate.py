@@ -0,0 +1,324 @@
+"""
+Measure how the time taken by interpolate_construction_plan.py grows with the
+size of the construction plan, using synthetic scenarios.
+
+make_scenario() creates the same tables read_scenario() would read from a
+solved model (heco_outlook.json targets, periods.csv, BuildGen.csv,
+BuildStorageEnergy.csv, etc.), with a chosen number of projects, tech groups,
+techs per group, asset lives, study length and period length. Each project
+is built once in a random period and then rebuilt whenever it retires (at the
+start of the period after its life-extended retirement, as Switch would), and
+heco_outlook.json targets bring part of each project's first build forward to
+the year before its period, so all the adjustment steps have work to do.
+write_scenario() saves a scenario as outputs, inputs and inputs_annual
+directories, which can be used with interpolate_construction_plan.py itself.
+
+run_benchmark() times target construction, retirement shifting, target
+filling, export of the adjusted plan, target checking and trimming separately
+by wrapping the functions in
+interpolate_construction_plan (in the same way the input writers are wrapped
+by input_profile.py).
+
+Usage:
+
+    python benchmark_interpolate.py --projects 100 1000 10000 --repeat 3
+    python benchmark_interpolate.py --projects 1000 --write-dir synthetic
+"""
+
+from __future__ import print_function
+import os, sys, csv, json, time, argparse
+import numpy as np
+import pandas as pd
+
+import interpolate_construction_plan as icp
+
+# functions in interpolate_construction_plan timed for each stage
+stage_functions = [
+    ('targets', ['heco_targets', 'switch_targets', 'interpolate_targets']),
+    ('shift', ['shift_extended_rebuilds']),
+    ('fill', ['meet_targets']),
+    ('export', ['predetermined_plan']),
+    ('check', ['check_targets']),
+    ('trim', ['trim_excess_capacity']),
+]
+stages = [s for s, functions in stage_functions]
+# the rest of the time ('other') is spent preparing the tables
+
+report_columns = [
+    'projects', 'tech_groups', 'techs_per_group', 'horizon', 'period_length',
+    'build_rows'
+] + stages + ['other', 'total']
+
+# tech groups that interpolate_construction_plan() expects, with asset lives;
+# the storage groups must be called Battery_Bulk and DistBattery and hold one
+# tech each
+standard_tech_groups = [
+    ('LargePV', 30), ('OnshoreWind', 20), ('OffshoreWind', 30),
+    ('Battery_Bulk', 15), ('DistPV', 25), ('DistBattery', 15),
+]
+storage_tech_groups = ['Battery_Bulk', 'DistBattery']
+
+# MWh of storage built per MW of battery capacity
+storage_hours = 4.0
+
+# share of each project's first build that heco_outlook.json schedules for
+# the year before its period
+heco_early_share = 0.5
+
+def make_periods(horizon, period_length):
+    """
+    Return a periods.csv table for a study of horizon years starting in 2020,
+    with periods in 2020 and 2022 (required by interpolate_targets()), then
+    every period_length years from 2025 and a one-year period at the end, like
+    the standard study. (The last period is kept short because construction
+    that retires during it is extended to the end of the study, which can't be
+    matched in the annual model.)
+    """
+    if horizon < 3:
+        raise ValueError('horizon must be at least 3 years.')
+    last_year = 2020 + horizon - 1
+    starts = sorted(set(
+        [2020, 2022, last_year] + list(range(2025, last_year, period_length))
+    ))
+    ends = starts[1:] + [last_year + 1]
+    return pd.DataFrame({
+        'INVESTMENT_PERIOD': starts,
+        'period_start': starts,
+        'period_end': [float(e) for e in ends],
+    }, columns=['INVESTMENT_PERIOD', 'period_start', 'period_end'])
+
+def make_scenario(
+    projects=100, extra_tech_groups=0, techs_per_group=2, ages=None,
+    horizon=26, period_length=5, existing_share=0.2, seed=0
+):
+    """
+    Return a dict of synthetic arguments for interpolate_construction_plan()
+    (see read_scenario()). ages can give a list of asset lives to use for the
+    tech groups instead of the standard ones (repeated as needed).
+    """
+    rng = np.random.RandomState(seed)
+    periods = make_periods(horizon, period_length)
+    period_starts = periods['INVESTMENT_PERIOD'].values
+    last_year = 2020 + horizon - 1
+
+    tech_groups = list(standard_tech_groups) + [
+        ('Group{}'.format(i), 25) for i in range(extra_tech_groups)
+    ]
+    if ages:
+        tech_groups = [(g, ages[i % len(ages)]) for i, (g, a) in enumerate(tech_groups)]
+    techs_for_tech_group = {
+        g: [g] if g in storage_tech_groups
+        else ['{}_{}'.format(g, j) for j in range(techs_per_group)]
+        for g, a in tech_groups
+    }
+    tech_tech_group = {t: g for g, techs in techs_for_tech_group.items() for t in techs}
+    group_age = dict(tech_groups)
+
+    gen_rows = []
+    builds = []  # (gen, year, cap)
+    existing = []  # (gen, year, cap)
+    heco_power = []
+    heco_energy = []
+    group_names = [g for g, a in tech_groups]
+    for i in range(projects):
+        group = group_names[i % len(group_names)]
+        tech = techs_for_tech_group[group][(i // len(group_names)) % len(techs_for_tech_group[group])]
+        age = group_age[group]
+        gen = 'Gen{}_{}'.format(i, tech)
+        cap = float(rng.randint(1, 200))
+        gen_rows.append((gen, tech, cap, age))
+        if group not in storage_tech_groups and rng.rand() < existing_share:
+            # existing plant, rebuilt when it retires
+            year = int(rng.randint(2020 - age + 1, 2020))
+            existing.append((gen, year, cap))
+        else:
+            year = int(rng.choice(period_starts))
+            if year > 2020:
+                # HECO expects some of this a year early
+                heco_power.append([year - 1, group, cap * heco_early_share])
+                if group in storage_tech_groups:
+                    heco_energy.append([year - 1, group, cap * storage_hours * heco_early_share])
+        # build and rebuild until the end of the study
+        while year <= last_year:
+            builds.append((gen, year, cap))
+            retire_year = year + age - 1
+            if retire_year >= period_starts[-1]:
+                break
+            # Switch extends life to the start of the next period
+            year = int(period_starts[np.searchsorted(period_starts, retire_year + 1)])
+
+    gen_info = pd.DataFrame(
+        gen_rows,
+        columns=['GENERATION_PROJECT', 'gen_tech', 'gen_capacity_limit_mw', 'gen_max_age']
+    )
+    build_gen = pd.DataFrame(
+        builds, columns=['GEN_BLD_YRS_1', 'GEN_BLD_YRS_2', 'BuildGen']
+    )
+    storage_gens = set(
+        g for g, tech, cap, age in gen_rows if tech_tech_group[tech] in storage_tech_groups
+    )
+    build_storage = build_gen[build_gen['GEN_BLD_YRS_1'].isin(storage_gens)]
+    build_storage = pd.DataFrame({
+        'STORAGE_GEN_BLD_YRS_1': build_storage['GEN_BLD_YRS_1'],
+        'STORAGE_GEN_BLD_YRS_2': build_storage['GEN_BLD_YRS_2'],
+        'BuildStorageEnergy': build_storage['BuildGen'] * storage_hours,
+    }, columns=['STORAGE_GEN_BLD_YRS_1', 'STORAGE_GEN_BLD_YRS_2', 'BuildStorageEnergy'])
+    existing_builds = pd.DataFrame(
+        existing, columns=['GENERATION_PROJECT', 'build_year', 'gen_predetermined_cap']
+    )
+    # every project can be built in every study year in the annual model
+    annual_build_costs = pd.DataFrame(
+        [(g, year) for g, year, cap in existing]
+        + [(g[0], y) for g in gen_rows for y in range(2020, last_year + 1)],
+        columns=['GENERATION_PROJECT', 'build_year']
+    )
+    annual_build_costs['gen_overnight_cost'] = 1000000.0
+    annual_build_costs['gen_storage_energy_overnight_cost'] = float('nan')
+    annual_build_costs['gen_fixed_om'] = 10000.0
+    targets = dict(
+        tech_group_power_targets=heco_power,
+        tech_group_energy_targets=heco_energy,
+        techs_for_tech_group=techs_for_tech_group,
+        tech_tech_group=tech_tech_group,
+    )
+    return dict(
+        targets=targets,
+        periods=periods,
+        build_gen=build_gen,
+        build_storage=build_storage,
+        gen_info=gen_info,
+        existing_builds=existing_builds,
+        annual_build_costs=annual_build_costs,
+        annual_existing_builds=existing_builds.copy(),
+    )
+
+def write_scenario(
+    scenario, outputs_dir='outputs', inputs_dir='inputs', annual_inputs_dir='inputs_annual'
+):
+    """ Save a scenario from make_scenario() where read_scenario() will find it. """
+    for d in [outputs_dir, inputs_dir, annual_inputs_dir]:
+        if not os.path.exists(d):
+            os.makedirs(d)
+    with open(os.path.join(outputs_dir, 'heco_outlook.json'), 'w') as f:
+        json.dump(scenario['targets'], f)
+    for d, file, table in [
+        (inputs_dir, 'periods.csv', 'periods'),
+        (outputs_dir, 'BuildGen.csv', 'build_gen'),
+        (outputs_dir, 'BuildStorageEnergy.csv', 'build_storage'),
+        (inputs_dir, 'generation_projects_info.csv', 'gen_info'),
+        (inputs_dir, 'gen_build_predetermined.csv', 'existing_builds'),
+        (annual_inputs_dir, 'gen_build_costs.csv', 'annual_build_costs'),
+        (annual_inputs_dir, 'gen_build_predetermined.csv', 'annual_existing_builds'),
+    ]:
+        scenario[table].to_csv(os.path.join(d, file), index=False, na_rep='.')
+
+def timed(stage, function, times):
+    def timed_function(*args, **kwargs):
+        start = time.time()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            times[stage] += time.time() - start
+    return timed_function
+
+def run_benchmark(scenario, horizon=26):
+    """
+    Run interpolate_construction_plan() on scenario (from make_scenario()) and
+    return the time taken by each stage, in seconds.
+    """
+    times = {s: 0.0 for s in stages}
+    originals = dict(study_years=icp.study_years)
+    for stage, functions in stage_functions:
+        for name in functions:
+            originals[name] = getattr(icp, name)
+            setattr(icp, name, timed(stage, originals[name], times))
+    icp.study_years = list(range(2020, 2020 + horizon))
+    stdout = sys.stdout
+    # hide the reports of targets met and missed
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        start = time.time()
+        icp.interpolate_construction_plan(**{
+            k: v.copy() if isinstance(v, pd.DataFrame) else v
+            for k, v in scenario.items()
+        })
+        times['total'] = time.time() - start
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+        for name, value in originals.items():
+            setattr(icp, name, value)
+    times['other'] = times['total'] - sum(times[s] for s in stages)
+    return times
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description='Time interpolate_construction_plan() on synthetic scenarios of '
+            'different sizes.'
+    )
+    parser.add_argument('--projects', type=int, nargs='+', default=[100, 1000],
+        help='Number of projects in each scenario to time (default is 100 1000).')
+    parser.add_argument('--extra-tech-groups', type=int, default=0,
+        help='Number of tech groups to add to the standard ones (default is 0).')
+    parser.add_argument('--techs-per-group', type=int, default=2,
+        help='Number of techs in each non-storage tech group (default is 2).')
+    parser.add_argument('--ages', type=int, nargs='+', default=None,
+        help='Asset lives to use for the tech groups, in turn (default is '
+             'typical lives for each group).')
+    parser.add_argument('--horizon', type=int, default=26,
+        help='Number of years in the study, starting in 2020 (default is 26).')
+    parser.add_argument('--period-length', type=int, default=5,
+        help='Years per investment period from 2025 (default is 5).')
+    parser.add_argument('--repeat', type=int, default=1,
+        help='Number of times to run each scenario; the fastest run is '
+             'reported (default is 1).')
+    parser.add_argument('--seed', type=int, default=0,
+        help='Seed for the random number generator (default is 0).')
+    parser.add_argument('--report', default=None,
+        help='Add the results to this .csv file.')
+    parser.add_argument('--write-dir', default=None,
+        help='Save each scenario in outputs, inputs and inputs_annual '
+             'directories in <write-dir>/<projects>, instead of timing it.')
+    args = parser.parse_args(args)
+
+    results = []
+    for projects in args.projects:
+        scenario = make_scenario(
+            projects, args.extra_tech_groups, args.techs_per_group, args.ages,
+            args.horizon, args.period_length, seed=args.seed
+        )
+        if args.write_dir is not None:
+            d = os.path.join(args.write_dir, str(projects))
+            write_scenario(
+                scenario, os.path.join(d, 'outputs'), os.path.join(d, 'inputs'),
+                os.path.join(d, 'inputs_annual')
+            )
+            print("Wrote scenario with {} projects in {}".format(projects, d))
+            continue
+        runs = [run_benchmark(scenario, args.horizon) for r in range(args.repeat)]
+        best = min(runs, key=lambda t: t['total'])
+        result = dict(
+            best,
+            projects=projects,
+            tech_groups=len(scenario['targets']['techs_for_tech_group']),
+            techs_per_group=args.techs_per_group,
+            horizon=args.horizon,
+            period_length=args.period_length,
+            build_rows=len(scenario['build_gen']),
+        )
+        results.append(result)
+        print(
+            "{:,} projects ({:,} builds): ".format(projects, result['build_rows'])
+            + ", ".join("{} {:.3f}s".format(s, result[s]) for s in stages + ['other', 'total'])
+        )
+    if args.report and results:
+        new_file = not os.path.exists(args.report)
+        with open(args.report, 'a') as f:
+            w = csv.DictWriter(f, fieldnames=report_columns, lineterminator='\n')
+            if new_file:
+                w.writeheader()
+            for r in results:
+                w.writerow({c: r[c] for c in report_columns})
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+"""
+Write variable_capacity_factors.csv from a precomputed, memory-mapped array of
+hourly capacity factors, instead of joining the cap_factor table to the time
+sample in the database for every inputs directory.
+
+The store holds a (project x hour) array of every capacity factor in the
+database for the projects in the study's load zones (data.npy), plus an index
+(index.json) giving the project_id for each row and the date_time for each
+column. It is built once per database and set of load zones. After that, each
+time sample only needs to look up its timepoints and projects, then slice the
+matching columns out of the array.
+
+Call install() after input_manifest.install() to use the store. Call
+prepare_stores() in the main process before starting parallel builds, so they
+don't each build it. Use clear() (get_scenario_data.py --refresh-cache) after
+updating the capacity factors in the database.
+"""
+
+from __future__ import print_function
+import os, sys, time, json, hashlib, shutil
+from textwrap import dedent
+import numpy as np
+
+import switch_model.hawaii.scenario_data as scenario_data
+import query_cache, input_manifest
+
+output_file_name = 'variable_capacity_factors.csv'
+
+# directory holding stores for each database and set of load zones
+store_dir = None
+
+# scenario_data.write_table() before this module was installed
+other_write_table = None
+
+# CapFactorStore objects opened in this process
+stores = dict()
+
+# these reproduce the joins in scenario_data's variable_capacity_factors query
+projects_query = """
+    SELECT "GENERATION_PROJECT", project_id
+    FROM study_generator_info g JOIN study_projects p USING (technology)
+    ORDER BY 1;
+"""
+timepoints_query = """
+    SELECT study_hour, date_time
+    FROM study_hour
+    WHERE time_sample = %(time_sample)s
+    ORDER BY 1;
+"""
+store_query = """
+    SELECT {} FROM cap_factor c JOIN project p USING (project_id)
+    WHERE p.load_zone IN %(load_zones)s
+"""
+
+class CapFactorStore(object):
+    """ Memory-mapped array of hourly capacity factors with its index. """
+    def __init__(self, path):
+        with open(os.path.join(path, 'index.json')) as f:
+            index = json.load(f)
+        self.data = np.load(os.path.join(path, 'data.npy'), mmap_mode='r')
+        self.project_pos = {p: i for i, p in enumerate(index['project_ids'])}
+        self.hour_pos = {h: j for j, h in enumerate(index['date_times'])}
+
+def store_path(arguments):
+    key = hashlib.sha1(repr((
+        scenario_data.uncached_db_cursor().connection.dsn,
+        sorted(arguments['load_zones'])
+    )).encode('utf-8')).hexdigest()
+    return os.path.join(store_dir, key)
+
+def ensure_store(arguments):
+    """ Build the store for the load zones in arguments if it doesn't exist yet. """
+    path = store_path(arguments)
+    if not os.path.exists(path):
+        build_store(path, arguments)
+    return path
+
+def build_store(path, arguments):
+    print("Building capacity factor store in {} ...".format(path), end=' ')
+    sys.stdout.flush()  # display the part line to the user
+    start = time.time()
+
+    # use the database directly, so the big query results don't fill up the
+    # query cache
+    cur = scenario_data.uncached_db_cursor()
+    cur.execute(dedent(store_query.format('DISTINCT project_id')) + ' ORDER BY 1;', arguments)
+    project_ids = [r[0] for r in cur.fetchall()]
+    cur.execute(dedent(store_query.format('DISTINCT date_time')) + ' ORDER BY 1;', arguments)
+    date_times = [str(r[0]) for r in cur.fetchall()]
+    project_pos = {p: i for i, p in enumerate(project_ids)}
+    hour_pos = {h: j for j, h in enumerate(date_times)}
+
+    # build in a temporary directory, then move into place
+    temp_path = '{}.{}.tmp'.format(path, os.getpid())
+    os.makedirs(temp_path)
+    data = np.lib.format.open_memmap(
+        os.path.join(temp_path, 'data.npy'), mode='w+',
+        dtype=np.float64, shape=(len(project_ids), len(date_times))
+    )
+    # null or missing capacity factors are stored as nan
+    data[:] = np.nan
+    server_cur = cur.connection.cursor(name='cap_factor_store')
+    server_cur.itersize = query_cache.chunk_size
+    server_cur.execute(
+        dedent(store_query.format('project_id, date_time, cap_factor')), arguments
+    )
+    while True:
+        rows = server_cur.fetchmany(query_cache.chunk_size)
+        if not rows:
+            break
+        rows_pos = (
+            np.array([project_pos[r[0]] for r in rows], dtype=np.int64),
+            np.array([hour_pos[str(r[1])] for r in rows], dtype=np.int64)
+        )
+        data[rows_pos] = np.array(
+            [np.nan if r[2] is None else r[2] for r in rows], dtype=np.float64
+        )
+    server_cur.close()
+    data.flush()
+    del data
+    with open(os.path.join(temp_path, 'index.json'), 'w') as f:
+        json.dump(dict(project_ids=project_ids, date_times=date_times), f)
+    if os.path.exists(path):
+        # built by another process in the meantime
+        shutil.rmtree(temp_path)
+    else:
+        os.rename(temp_path, path)
+
+    print("time taken: {dur:.2f}s".format(dur=time.time()-start))
+
+def prepare_stores(arguments_list):
+    """ Build the stores needed for all the arguments in arguments_list. """
+    paths = set()
+    for arguments in arguments_list:
+        if not arguments.get('skip_cf', False):
+            paths.add(ensure_store(arguments))
+    return paths
+
+def get_store(arguments):
+    path = ensure_store(arguments)
+    if path not in stores:
+        stores[path] = CapFactorStore(path)
+    return stores[path]
+
+def write_table(output_file, query, arguments):
+    if output_file != output_file_name:
+        other_write_table(output_file, query, arguments)
+        return
+    path = ensure_store(arguments)
+    key = input_manifest.data_key(
+        os.path.basename(path),
+        query_cache.query_key(scenario_data.db_cursor(), dedent(query), arguments)
+    )
+    output_path = scenario_data.make_file_path(output_file, arguments)
+    input_manifest.write_if_changed(
+        output_file, arguments, key,
+        lambda: write_cap_factors(output_path, arguments)
+    )
+
+def write_cap_factors(output_path, arguments):
+    print("Writing {file} ...".format(file=output_path), end=' ')
+    sys.stdout.flush()  # display the part line to the user
+    start = time.time()
+
+    store = get_store(arguments)
+    cur = scenario_data.db_cursor()
+    cur.execute(dedent(timepoints_query), arguments)
+    timepoints = [
+        (tp, store.hour_pos[str(date_time)]) for tp, date_time in cur.fetchall()
+        if str(date_time) in store.hour_pos
+    ]
+    tp_labels = [scenario_data.stringify(tp) for tp, j in timepoints]
+    tp_cols = np.array([j for tp, j in timepoints], dtype=np.int64)
+    cur.execute(dedent(projects_query), arguments)
+    projects = cur.fetchall()
+
+    stringify = scenario_data.stringify
+    with open(output_path, 'w') as f:
+        scenario_data.writerow(
+            f, ['GENERATION_PROJECT', 'timepoint', 'gen_max_capacity_factor']
+        )
+        for gen, project_id in projects:
+            i = store.project_pos.get(project_id)
+            if i is None:
+                # no capacity factors for this project
+                continue
+            gen = stringify(gen)
+            f.write(''.join(
+                gen + ',' + tp + ',' + stringify(cf) + '\n'
+                for tp, cf in zip(tp_labels, store.data[i, tp_cols].tolist())
+                if cf == cf  # skip nan
+            ))
+
+    print("time taken: {dur:.2f}s".format(dur=time.time()-start))
+
+def clear():
+    """ Remove all capacity factor stores. """
+    if store_dir is not None and os.path.exists(store_dir):
+        shutil.rmtree(store_dir)
+
+def install(directory):
+    """
+    Make scenario_data write variable_capacity_factors.csv from capacity
+    factor stores kept in directory.
+    """
+    global store_dir, other_write_table
+    store_dir = directory
+    if not os.path.exists(store_dir):
+        os.makedirs(store_dir)
+    if other_write_table is None:
+        other_write_table = scenario_data.write_table
+    scenario_data.write_table = write_table
@@ -0,0 +1,139 @@
+"""
+Write ev_charging_bids.csv in chunks, optionally along with a dense array
+version of the same data (ev_charging_bids.npz).
+
+This is the largest input file, and it grows with the number of timepoints
+(150 bids per load zone and timepoint), so scenario_data's normal row-by-row
+writer is slow for the annual model. Here the query results are retrieved from
+the database (or query cache) in chunks and each chunk is written to the .csv
+file with a single call. If columnar output is requested, the chunks are also
+collected into numpy arrays and saved as a (load zone x vehicle type x bid x
+timepoint) array, which can be read back much faster than the .csv file (see
+read_ev_bids()).
+
+Call install() after input_manifest.install() to use this writer.
+"""
+
+from __future__ import print_function
+import os, sys, time
+from textwrap import dedent
+import numpy as np
+import pandas as pd
+
+import switch_model.hawaii.scenario_data as scenario_data
+import query_cache, input_manifest
+
+output_file_name = 'ev_charging_bids.csv'
+index_cols = ['LOAD_ZONE', 'VEHICLE_TYPE', 'BID_NUM', 'TIMEPOINT']
+value_col = 'ev_bid_by_type'
+
+# also write a .npz version of the bids
+columnar = False
+
+# scenario_data.write_table() before this module was installed
+other_write_table = None
+
+def columnar_path(csv_path):
+    return os.path.splitext(csv_path)[0] + '.npz'
+
+def write_table(output_file, query, arguments):
+    if output_file != output_file_name:
+        other_write_table(output_file, query, arguments)
+        return
+    query = dedent(query)
+    key = query_cache.query_key(scenario_data.db_cursor(), query, arguments)
+    output_path = scenario_data.make_file_path(output_file, arguments)
+    input_manifest.write_if_changed(
+        output_file, arguments, key,
+        lambda: write_ev_bids(output_path, query, arguments),
+        extra_files=[columnar_path(output_path)] if columnar else []
+    )
+
+def write_ev_bids(output_path, query, arguments):
+    print("Writing {file} ...".format(file=output_path), end=' ')
+    sys.stdout.flush()  # display the part line to the user
+    start = time.time()
+
+    cur = scenario_data.db_cursor()
+    cur.execute(query, arguments)
+    if columnar:
+        collector = BidCollector([d[0] for d in cur.description])
+    stringify = scenario_data.stringify
+    with open(output_path, 'w') as f:
+        scenario_data.writerow(f, [d[0] for d in cur.description])
+        while True:
+            rows = cur.fetchmany(query_cache.chunk_size)
+            if not rows:
+                break
+            f.write(''.join(
+                ','.join(stringify(c) for c in r) + '\n' for r in rows
+            ))
+            if columnar:
+                collector.add(rows)
+    if columnar:
+        collector.save(columnar_path(output_path))
+
+    print("time taken: {dur:.2f}s".format(dur=time.time()-start))
+
+class BidCollector(object):
+    """
+    Accumulate bid rows as compact integer coordinates and float values, then
+    save them as a dense array.
+    """
+    def __init__(self, columns):
+        self.col_pos = [columns.index(c) for c in index_cols]
+        self.value_pos = columns.index(value_col)
+        # dicts mapping each index value to its position on that axis, in
+        # the order first seen (the query sorts by all index columns)
+        self.axes = [dict() for c in index_cols]
+        self.coords = [[] for c in index_cols]
+        self.values = []
+
+    def add(self, rows):
+        for axis, coords, pos in zip(self.axes, self.coords, self.col_pos):
+            coords.append(np.fromiter(
+                (axis.setdefault(r[pos], len(axis)) for r in rows),
+                dtype=np.int32, count=len(rows)
+            ))
+        self.values.append(np.fromiter(
+            (r[self.value_pos] for r in rows), dtype=np.float64, count=len(rows)
+        ))
+
+    def save(self, path):
+        shape = tuple(len(axis) for axis in self.axes)
+        bids = np.full(shape, np.nan)
+        if self.values:
+            coords = tuple(np.concatenate(c) for c in self.coords)
+            bids[coords] = np.concatenate(self.values)
+        labels = {
+            col: np.array(sorted(axis, key=axis.get))
+            for col, axis in zip(index_cols, self.axes)
+        }
+        # note: np.savez adds .npz to the name if it's not there already, so
+        # we write to a file object to keep the exact name
+        with open(path, 'wb') as f:
+            np.savez(f, **dict(labels, **{value_col: bids}))
+
+def read_ev_bids(path):
+    """
+    Read ev_charging_bids.npz and return a pandas DataFrame in the same long
+    format as ev_charging_bids.csv.
+    """
+    with np.load(path) as data:
+        bids = data[value_col]
+        index = pd.MultiIndex.from_product(
+            [data[c] for c in index_cols], names=index_cols
+        )
+    df = pd.Series(bids.ravel(), index=index, name=value_col).dropna()
+    return df.reset_index()
+
+def install(columnar_output=False):
+    """
+    Make scenario_data write ev_charging_bids.csv in chunks, and also as
+    ev_charging_bids.npz if columnar_output is True.
+    """
+    global columnar, other_write_table
+    columnar = columnar_output
+    if other_write_table is None:
+        other_write_table = scenario_data.write_table
+    scenario_data.write_table = write_table
@@ -1,24 +1,112 @@
 #!/usr/bin/env python
 
 from __future__ import print_function, division
-import sys, os, argparse
+import sys, os, re, json, argparse, time, itertools, multiprocessing
 
 import switch_model.hawaii.scenario_data as scenario_data
+import query_cache, input_manifest, ev_bids, cap_factor_store, time_sample_pins, model_size, input_profile
 
 
 parser = argparse.ArgumentParser()
 parser.add_argument('--skip-cf', action='store_true', default=False,
-    help='Skip writing variable capacity factors file (for faster execution)')
+    help='Skip writing variable capacity factors file (rarely needed now that '
+         'they are written from the capacity factor store).')
 parser.add_argument('--skip-ev-bids', action='store_true', default=False,
     help='Skip writing EV charging bids file (for faster execution)')
 # default is daily slice samples for all but 4 days in 2007-08
 parser.add_argument('--slice-count', type=int, default=0, # default=727,
-    help='Number of slices to generate for post-optimization evaluation.')
+    help='Number of slices to generate for post-optimization evaluation '
+         '(instead of the standard inputs directories).')
+parser.add_argument('--slice-time-sample', default='daily_slice_{:03d}',
+    help='Name of the time sample to use for each slice, with {} in place of '
+         'the slice number (default is daily_slice_{:03d}).')
+parser.add_argument('--slice-dir', default='inputs_slices',
+    help='Directory to create slice inputs directories in (default is '
+         'inputs_slices).')
 parser.add_argument('--tiny-only', action='store_true', default=False,
     help='Only prepare inputs for the tiny scenario for testing.')
+parser.add_argument('--jobs', type=int, default=1,
+    help='Number of inputs directories to build at the same time, each in its '
+         'own process (default is 1, i.e., build them one after another).')
+parser.add_argument('--ev-bids-columnar', action='store_true', default=False,
+    help='Also write EV charging bids as a dense array in ev_charging_bids.npz '
+         '(much faster to read back than ev_charging_bids.csv).')
+parser.add_argument('--sweep', default=None,
+    help='JSON file with argument overrides for a sweep of scenarios, instead '
+         'of the standard inputs directories. This can be a dict of '
+         '{argument: [value, value, ...]}, to build every combination, or a list '
+         'of {argument: value} dicts, to build each one. Use "hydrogen_args" with '
+         'a value of "current", "mid" or "future" to select a set of hydrogen '
+         'costs. Tables that are identical across scenarios are hard-linked.')
+parser.add_argument('--sweep-dir', default='inputs_sweep',
+    help='Directory to create scenario sweep inputs directories in (default is '
+         'inputs_sweep).')
+parser.add_argument('--profile', action='store_true', default=False,
+    help='Record time taken, query time, row count and size for every table '
+         'and add them to the --profile-report file.')
+parser.add_argument('--profile-report', default='inputs_profile.csv',
+    help='File to add table profiles to when using --profile (default is '
+         'inputs_profile.csv).')
+parser.add_argument('--cache-dir', default='.query_cache',
+    help='Directory to store database query results in, for reuse across '
+         'inputs directories and later runs (default is .query_cache).')
+parser.add_argument('--cache-size-mb', type=float, default=2000,
+    help='Maximum size of the query cache; least recently used results are '
+         'discarded beyond this (default is 2000).')
+parser.add_argument('--no-cache', action='store_true', default=False,
+    help='Run all queries against the database without using the query cache.')
+parser.add_argument('--refresh-cache', action='store_true', default=False,
+    help='Discard all cached query results before starting and rewrite all '
+         'tables (use this after the data in the database change).')
+parser.add_argument('--cf-store-dir', default='.cap_factor_store',
+    help='Directory to store the hourly capacity factors for all projects in, '
+         'for slicing into each time sample (default is .cap_factor_store). '
+         'This is built on the first run and cleared by --refresh-cache.')
+parser.add_argument('--no-cf-store', action='store_true', default=False,
+    help='Query the capacity factors for each time sample from the database '
+         'instead of using the capacity factor store.')
+parser.add_argument('--pin-time-samples', default='k_means*',
+    help='Save the dates and weights of time samples matching this pattern the '
+         'first time they are used, and reuse them on later runs even if the '
+         'time sample is re-created in the database (default is k_means*; use '
+         '"" to turn this off).')
+parser.add_argument('--pin-dir', default='.time_samples',
+    help='Directory to save pinned time samples in (default is .time_samples).')
+parser.add_argument('--repin-time-samples', action='store_true', default=False,
+    help='Replace pinned time samples with the current versions from the '
+         'database.')
+parser.add_argument('--dry-run', action='store_true', default=False,
+    help='Count the rows in each table and estimate the size of the model '
+         '(variables, binaries, memory and solve-time class) for each inputs '
+         'directory, without writing any input files.')
+parser.add_argument('--force', action='store_true', default=False,
+    help='Rewrite all tables, even if their arguments and source data are '
+         'unchanged since the last run.')
 
 cmd_line_args = parser.parse_args()
 
+# note: this is done at import time so worker processes use the cache and
+# manifest too
+cache = query_cache.install(
+    None if cmd_line_args.no_cache else cmd_line_args.cache_dir,
+    cmd_line_args.cache_size_mb
+)
+input_manifest.install(
+    force_rewrite=cmd_line_args.force or cmd_line_args.refresh_cache
+)
+ev_bids.install(columnar_output=cmd_line_args.ev_bids_columnar)
+if not cmd_line_args.no_cf_store:
+    cap_factor_store.install(cmd_line_args.cf_store_dir)
+if cmd_line_args.pin_time_samples:
+    time_sample_pins.install(
+        cmd_line_args.pin_dir, cmd_line_args.pin_time_samples,
+        cmd_line_args.repin_time_samples
+    )
+if cmd_line_args.dry_run:
+    model_size.install()
+elif cmd_line_args.profile:
+    input_profile.install()
+
 # settings used for the base scenario
 # (these will be passed as arguments when the queries are run)
 
@@ -65,9 +153,10 @@ TODO (soon):
 
 - convert AES to a PPA cost? (include it as fixed and variable O&M; but this doesn't allow fuel switching...)
 
-* also note: the current k-means re-creation code does not recreate dates with
-  the same weights each time; we should fix this or assign matching dates more
-  directly
++ the k-means re-creation code does not recreate dates with the same weights
+  each time, so --pin-time-samples (on by default for k_means*) saves the
+  dates and weights the first time each sample is used and reuses them after
+  that (--repin-time-samples picks up a deliberately re-created sample)
 
 - (0 days) exclude thermal technologies in get_scenario_data.py instead of editing the outputs or implementing in heco_outlook
   - adjust exclude technology rule to pull in the existing plants (e.g., exclude new schofield will still allow the existing one)
@@ -289,26 +378,164 @@ args.update(
 rps_2030 = {2020: 0.4, 2025: 0.7, 2030: 1.0}
 
 def write_inputs(args, **alt_args):
+    """
+    Write one inputs directory, using args updated with alt_args. Returns the
+    name of the inputs directory, the time taken (s) and a list of table
+    profiles (empty unless profiling is active).
+    """
     all_args = args.copy()
     all_args.update(alt_args)
+    start = time.time()
     scenario_data.write_tables(all_args)
-
-# write regular scenario
-write_inputs(args)
-
-# tiny scenario for testing
-write_inputs(args, inputs_dir='inputs_tiny', time_sample='tiny')
-
-# non-worst-day (could be used to experiment with weighting, but wasn't)
-# write_inputs(
-#     args,
-#     inputs_dir='inputs_non_worst',
-#     time_sample=args['time_sample'].replace('+', '')
-# )
-
-# annual model for post-optimization evaluation (may be too big to solve)
-write_inputs(
-    args,
-    inputs_dir='inputs_annual',
-    time_sample=args['time_sample'].replace('_235_', '_1_') # .replace('_2', '')
+    return all_args['inputs_dir'], time.time() - start, input_profile.take_records()
+
+def write_inputs_star(alt_args):
+    """ Call write_inputs(args, **alt_args); used as a process pool target. """
+    return write_inputs(args, **alt_args)
+
+def write_all_inputs(alt_args_list, jobs=1):
+    """
+    Write inputs directories for each set of alternative arguments in
+    alt_args_list. These are independent, so if jobs > 1, they are written in
+    parallel in a pool of that many processes. Returns a list of
+    (inputs_dir, seconds, profiles) tuples in the order the builds finished.
+    """
+    if jobs > 1 and len(alt_args_list) > 1:
+        pool = multiprocessing.Pool(min(jobs, len(alt_args_list)))
+        try:
+            # note: chunksize=1 makes workers take the next build as soon as
+            # they finish the current one
+            timings = list(pool.imap_unordered(write_inputs_star, alt_args_list, 1))
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        timings = [write_inputs_star(alt_args) for alt_args in alt_args_list]
+    return timings
+
+hydrogen_arg_sets = dict(
+    current=current_hydrogen_args,
+    mid=mid_hydrogen_args,
+    future=future_hydrogen_args,
 )
+
+def sweep_alt_args_list(grid, sweep_dir):
+    """
+    Return a list of alternative arguments for each scenario in a sweep, based
+    on grid (see --sweep help). Each scenario's inputs directory is named after
+    the overrides used, within sweep_dir.
+    """
+    if isinstance(grid, dict):
+        keys = sorted(grid.keys())
+        grid = [dict(zip(keys, vals)) for vals in itertools.product(*(grid[k] for k in keys))]
+    alt_args_list = []
+    for overrides in grid:
+        alt_args = dict()
+        for key, val in sorted(overrides.items()):
+            if key == 'hydrogen_args':
+                alt_args.update(hydrogen_arg_sets[val])
+            elif isinstance(val, list):
+                # lists are used for IN (...) clauses, which need tuples
+                alt_args[key] = tuple(val)
+            else:
+                alt_args[key] = val
+        alt_args['inputs_dir'] = os.path.join(sweep_dir, ','.join(
+            '{}={}'.format(key, sweep_label(val))
+            for key, val in sorted(overrides.items())
+        ))
+        alt_args_list.append(alt_args)
+    return alt_args_list
+
+def sweep_label(val):
+    """ Convert an override value into a string that can be used in a directory name. """
+    if isinstance(val, list):
+        return '+'.join(sweep_label(v) for v in val)
+    return re.sub(r'[^\w.+-]', '_', str(val))
+
+def slice_alt_args_list(slice_count, slice_dir, time_sample_format):
+    """
+    Return a list of alternative arguments for each slice inputs directory.
+    The first slice gets a complete set of tables; the others only get the
+    tables that vary between slices (timepoints, loads, capacity factors,
+    EVs, period-keyed fuel and build costs, etc.) and symlinks to the first slice for the rest.
+    """
+    slice_dirs = [
+        os.path.join(slice_dir, 'slice_{:03d}'.format(i)) for i in range(slice_count)
+    ]
+    alt_args_list = []
+    for i, inputs_dir in enumerate(slice_dirs):
+        alt_args = dict(
+            inputs_dir=inputs_dir,
+            time_sample=time_sample_format.format(i),
+        )
+        if i > 0:
+            alt_args['shared_inputs_dir'] = slice_dirs[0]
+        alt_args_list.append(alt_args)
+    return alt_args_list
+
+# alternative arguments for each inputs directory we create
+alt_args_list = [
+    # regular scenario
+    dict(),
+    # tiny scenario for testing
+    dict(inputs_dir='inputs_tiny', time_sample='tiny'),
+    # non-worst-day (could be used to experiment with weighting, but wasn't)
+    # dict(
+    #     inputs_dir='inputs_non_worst',
+    #     time_sample=args['time_sample'].replace('+', '')
+    # ),
+    # annual model for post-optimization evaluation (may be too big to solve)
+    dict(
+        inputs_dir='inputs_annual',
+        time_sample=args['time_sample'].replace('_235_', '_1_') # .replace('_2', '')
+    ),
+]
+if cmd_line_args.tiny_only:
+    alt_args_list = [a for a in alt_args_list if a.get('inputs_dir') == 'inputs_tiny']
+if cmd_line_args.sweep:
+    with open(cmd_line_args.sweep) as f:
+        alt_args_list = sweep_alt_args_list(json.load(f), cmd_line_args.sweep_dir)
+if cmd_line_args.slice_count:
+    alt_args_list = slice_alt_args_list(
+        cmd_line_args.slice_count,
+        cmd_line_args.slice_dir,
+        cmd_line_args.slice_time_sample
+    )
+
+# note: the main guard prevents worker processes from re-running the builds
+# on platforms that start them by importing this script
+if __name__ == '__main__':
+    if cmd_line_args.refresh_cache:
+        if cache is not None:
+            cache.clear()
+        cap_factor_store.clear()
+    start = time.time()
+    all_args_list = [dict(args, **a) for a in alt_args_list]
+    if cmd_line_args.pin_time_samples:
+        time_sample_pins.prepare_pins(all_args_list)
+    if not cmd_line_args.no_cf_store and not cmd_line_args.dry_run:
+        cap_factor_store.prepare_stores(all_args_list)
+    if scenario_data.con is not None:
+        # don't share this connection with worker processes
+        scenario_data.con.close()
+        scenario_data.con = None
+    timings = write_all_inputs(alt_args_list, jobs=cmd_line_args.jobs)
+    print()
+    print("Time taken per inputs directory:")
+    for inputs_dir, dur, profiles in timings:
+        print("    {}: {:.2f}s".format(inputs_dir, dur))
+    print("Total time taken: {:.2f}s".format(time.time() - start))
+    if cmd_line_args.profile and not cmd_line_args.dry_run:
+        profiles = [r for inputs_dir, dur, dir_profiles in timings for r in dir_profiles]
+        input_profile.append_report(
+            cmd_line_args.profile_report, profiles,
+            time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(start))
+        )
+        input_profile.print_summary(profiles)
+        print("Saved table profiles in {}.".format(cmd_line_args.profile_report))
+    if cmd_line_args.sweep and not cmd_line_args.dry_run:
+        saved = input_manifest.link_duplicates([a['inputs_dir'] for a in alt_args_list])
+        print(
+            "Saved {:.1f} MB by hard-linking identical tables."
+            .format(saved / (1024 * 1024))
+        )
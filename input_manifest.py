@@ -0,0 +1,268 @@
+"""
+Skip rewriting input tables whose dependencies haven't changed since the last
+time they were written by switch_model.hawaii.scenario_data.write_tables().
+
+Each inputs directory gets a manifest file (inputs_manifest.json) recording,
+for each table, a hash of everything it was built from, plus the size and
+modification time of the file that was written. For tables written from
+database queries, the hash covers the query with its arguments filled in and
+the contents of any temporary tables it uses (see query_cache.query_key());
+for tables written directly from the arguments, it covers the values written.
+On later runs, a table is only rewritten if that hash has changed or the file
+has been changed or removed since it was written.
+
+The manifest doesn't know when the data in the database change, so use
+install(force_rewrite=True) (get_scenario_data.py --force) to rewrite everything
+after updating the database.
+
+If the arguments include shared_inputs_dir, only the tables that vary between
+time slices (slice_tables below) are written; the others are symlinked to the
+matching files in shared_inputs_dir (see get_scenario_data.py --slice-count).
+
+Call install() before scenario_data.write_tables() to activate the manifest.
+query_cache.install() must also be called, to track temporary tables.
+"""
+
+from __future__ import print_function
+import os, json, hashlib, collections
+from textwrap import dedent
+
+import switch_model.hawaii.scenario_data as scenario_data
+import query_cache
+
+manifest_file = 'inputs_manifest.json'
+
+# original versions of the scenario_data writers (set by install())
+original_writers = dict()
+
+# rewrite all tables, even if they are unchanged
+force = False
+
+# Manifest objects for each inputs directory used in this process
+manifests = dict()
+
+# what happened to the last table passed to write_if_changed(): 'written',
+# 'skipped' or 'linked' (used by input_profile.py)
+last_status = None
+
+# tables that differ between time slices; EV tables (ev_*) do too. The fuel
+# and build cost tables are keyed to the study periods of the time sample, so
+# they have to be written for each slice in case the periods differ.
+slice_tables = [
+    'periods.csv', 'timeseries.csv', 'timepoints.csv', 'loads.csv',
+    'variable_capacity_factors.csv', 'gen_timepoint_commit_bounds.csv',
+    'fuel_cost.csv', 'fuel_supply_curves.csv', 'regional_fuel_markets.csv',
+    'gen_build_costs.csv',
+]
+
+class Manifest(object):
+    """ Record of the tables written in one inputs directory. """
+    def __init__(self, inputs_dir):
+        self.path = os.path.join(inputs_dir, manifest_file)
+        try:
+            with open(self.path) as f:
+                self.tables = json.load(f)
+        except (IOError, OSError, ValueError):
+            self.tables = dict()
+
+    def unchanged(self, output_file, key):
+        """
+        Report whether output_file was written from data matching key and
+        hasn't been altered since then.
+        """
+        entry = self.tables.get(os.path.basename(output_file))
+        if entry is None or entry['key'] != key:
+            return False
+        try:
+            st = os.stat(output_file)
+        except OSError:
+            return False
+        return entry['size'] == st.st_size and entry['mtime'] == st.st_mtime
+
+    def record(self, output_file, key):
+        """ Record that output_file has just been written from data matching key. """
+        st = os.stat(output_file)
+        self.tables[os.path.basename(output_file)] = dict(
+            key=key, size=st.st_size, mtime=st.st_mtime
+        )
+        self.save()
+
+    def restat(self, output_file):
+        """
+        Update the recorded size and modification time of output_file, e.g.,
+        after replacing it with an identical file.
+        """
+        entry = self.tables.get(os.path.basename(output_file))
+        if entry is not None:
+            self.record(output_file, entry['key'])
+
+    def save(self):
+        # write to a temporary file and then rename, so an interrupted run
+        # doesn't leave a damaged manifest
+        temp_path = '{}.{}.tmp'.format(self.path, os.getpid())
+        with open(temp_path, 'w') as f:
+            json.dump(self.tables, f, indent=1, sort_keys=True)
+        os.replace(temp_path, self.path)
+
+def get_manifest(output_file):
+    inputs_dir = os.path.dirname(output_file)
+    if inputs_dir not in manifests:
+        manifests[inputs_dir] = Manifest(inputs_dir)
+    return manifests[inputs_dir]
+
+def data_key(*data):
+    """ Return a key identifying the data that will be written to a table. """
+    return hashlib.sha1(
+        repr((scenario_data.switch_version,) + data).encode('utf-8')
+    ).hexdigest()
+
+def write_if_changed(output_file, arguments, key, write, extra_files=()):
+    """
+    Call write() to create output_file (relative to the inputs directory in
+    arguments) unless the manifest shows that it was already written from data
+    matching key. extra_files lists the paths of any other files created by
+    write(); these must also be unchanged for the table to be skipped.
+    """
+    global last_status
+    output_path = scenario_data.make_file_path(output_file, arguments)
+    shared_dir = arguments.get('shared_inputs_dir')
+    if shared_dir is not None and not is_slice_table(output_file):
+        for p in [output_path] + list(extra_files):
+            link_shared_table(p, shared_dir)
+        last_status = 'linked'
+        return
+    manifest = get_manifest(output_path)
+    paths = [output_path] + list(extra_files)
+    if not force and all(manifest.unchanged(p, key) for p in paths):
+        print("Skipping {file} (unchanged)".format(file=output_path))
+        last_status = 'skipped'
+    else:
+        last_status = 'written'
+        # break any hard links created by link_duplicates(), so we don't
+        # overwrite the same file in other inputs directories
+        for p in paths:
+            if os.path.exists(p) and os.stat(p).st_nlink > 1:
+                os.remove(p)
+        write()
+        for p in paths:
+            manifest.record(p, key)
+
+def write_table(output_file, query, arguments):
+    query = dedent(query)
+    key = query_cache.query_key(scenario_data.db_cursor(), query, arguments)
+    write_if_changed(
+        output_file, arguments, key,
+        lambda: original_writers['write_table'](output_file, query, arguments)
+    )
+
+def write_indexed_set_dat_file(output_file, set_name, query, arguments):
+    query = dedent(query)
+    key = query_cache.query_key(scenario_data.db_cursor(), query, arguments)
+    write_if_changed(
+        output_file, arguments, data_key(set_name, key),
+        lambda: original_writers['write_indexed_set_dat_file'](
+            output_file, set_name, query, arguments
+        )
+    )
+
+def write_csv_file(output_file, headers, data, arguments={}):
+    data = list(data)
+    write_if_changed(
+        output_file, arguments, data_key(headers, data),
+        lambda: original_writers['write_csv_file'](output_file, headers, data, arguments)
+    )
+
+def write_simple_csv(output_file, args_to_write, arguments):
+    # note: the original function only creates the file if some of these
+    # arguments are defined
+    values = [(a, str(arguments[a])) for a in args_to_write if a in arguments]
+    if values:
+        write_if_changed(
+            output_file, arguments, data_key(values),
+            lambda: original_writers['write_simple_csv'](output_file, args_to_write, arguments)
+        )
+
+def write_dat_file(output_file, args_to_write, arguments):
+    values = [(a, str(arguments[a])) for a in args_to_write if a in arguments]
+    if values:
+        write_if_changed(
+            output_file, arguments, data_key(values),
+            lambda: original_writers['write_dat_file'](output_file, args_to_write, arguments)
+        )
+
+def install(force_rewrite=False):
+    """
+    Make scenario_data skip writing tables that are unchanged since the last
+    run (or rewrite all of them if force_rewrite is True).
+    """
+    global force
+    force = force_rewrite
+    for name, writer in [
+        ('write_table', write_table),
+        ('write_indexed_set_dat_file', write_indexed_set_dat_file),
+        ('write_csv_file', write_csv_file),
+        ('write_simple_csv', write_simple_csv),
+        ('write_dat_file', write_dat_file),
+    ]:
+        original_writers.setdefault(name, getattr(scenario_data, name))
+        setattr(scenario_data, name, writer)
+
+def is_slice_table(output_file):
+    return output_file in slice_tables or output_file.startswith('ev_')
+
+def link_shared_table(path, shared_dir):
+    """ Make path a symlink to the file with the same name in shared_dir. """
+    target = os.path.relpath(
+        os.path.join(shared_dir, os.path.basename(path)), os.path.dirname(path)
+    )
+    if os.path.islink(path) and os.readlink(path) == target:
+        return
+    if os.path.lexists(path):
+        os.remove(path)
+    os.symlink(target, path)
+    print("Linked {file} to {target}".format(file=path, target=target))
+
+# files that are written directly (not through the writers above), so they
+# can't be shared between inputs directories
+unlinkable_files = [manifest_file, 'switch_inputs_version.txt']
+
+def file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def link_duplicates(inputs_dirs):
+    """
+    Replace tables that are identical in several of the inputs_dirs with hard
+    links to a single copy, and update the manifests to match. (The writers
+    above break these links before rewriting a table.) Returns the number of
+    bytes saved.
+    """
+    # only files with the same name and size can be identical
+    candidates = collections.defaultdict(list)
+    for inputs_dir in inputs_dirs:
+        for name in sorted(os.listdir(inputs_dir)):
+            path = os.path.join(inputs_dir, name)
+            if name not in unlinkable_files and os.path.isfile(path):
+                candidates[name, os.path.getsize(path)].append(path)
+    saved = 0
+    for (name, size), paths in candidates.items():
+        if len(paths) < 2:
+            continue
+        originals = dict()  # first path found with each hash
+        for path in paths:
+            original = originals.setdefault(file_hash(path), path)
+            if os.path.samefile(original, path):
+                continue
+            temp_path = path + '.tmp'
+            try:
+                os.link(original, temp_path)
+            except OSError:
+                # file system doesn't support hard links
+                return saved
+            os.replace(temp_path, path)
+            get_manifest(path).restat(path)
+            saved += size
+    return saved
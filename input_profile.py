@@ -0,0 +1,109 @@
+"""
+Record the time taken, query time, row count and size of every table written
+by switch_model.hawaii.scenario_data.write_tables().
+
+Call install() after the other writer modules (query_cache, input_manifest,
+ev_bids) are installed, so the measurements include their work. Each process
+collects records in the records list; append_report() adds them to a .csv file
+that accumulates results from every profiled run.
+"""
+
+from __future__ import print_function
+import os, csv, time
+
+import switch_model.hawaii.scenario_data as scenario_data
+import query_cache, input_manifest
+
+report_columns = [
+    'run_start', 'inputs_dir', 'table', 'status',
+    'wall_time', 'query_time', 'rows', 'bytes'
+]
+
+# position of the arguments dict in the positional arguments of each writer
+arguments_pos = dict(
+    write_table=2,
+    write_indexed_set_dat_file=3,
+    write_csv_file=3,
+    write_simple_csv=2,
+    write_dat_file=2,
+)
+
+# profile records for all tables written in this process
+records = []
+
+def profiled(name, writer):
+    """ Return a version of writer that adds a record to records for each table. """
+    pos = arguments_pos[name]
+    def profiled_writer(output_file, *args, **kwargs):
+        all_args = (output_file,) + args
+        arguments = kwargs.get(
+            'arguments', all_args[pos] if len(all_args) > pos else {}
+        )
+        input_manifest.last_status = None
+        start_query_time = query_cache.query_time
+        start = time.time()
+        writer(output_file, *args, **kwargs)
+        wall_time = time.time() - start
+        path = scenario_data.make_file_path(output_file, arguments)
+        status = input_manifest.last_status
+        if status is None:
+            status = 'written' if os.path.exists(path) else 'not written'
+        if status == 'linked' or not os.path.exists(path):
+            rows = size = 0
+        else:
+            size = os.path.getsize(path)
+            rows = count_rows(path)
+        records.append(dict(
+            inputs_dir=os.path.dirname(path),
+            table=output_file,
+            status=status,
+            wall_time=wall_time,
+            query_time=query_cache.query_time - start_query_time,
+            rows=rows,
+            bytes=size,
+        ))
+    return profiled_writer
+
+def count_rows(path):
+    """ Return the number of data rows in a .csv file or lines in a .dat file. """
+    with open(path, 'rb') as f:
+        lines = sum(block.count(b'\n') for block in iter(lambda: f.read(1024 * 1024), b''))
+    return lines - 1 if path.endswith('.csv') else lines
+
+def take_records():
+    """ Return the records collected so far and start a new list. """
+    global records
+    result, records = records, []
+    return result
+
+def append_report(report_file, run_records, run_start):
+    """ Add run_records to report_file, creating it if needed. """
+    new_file = not os.path.exists(report_file)
+    with open(report_file, 'a') as f:
+        w = csv.DictWriter(f, fieldnames=report_columns, lineterminator='\n')
+        if new_file:
+            w.writeheader()
+        for r in run_records:
+            w.writerow(dict(r, run_start=run_start))
+
+def print_summary(run_records, count=10):
+    """ Print the tables that took the most time. """
+    print("Slowest tables:")
+    for r in sorted(run_records, key=lambda r: r['wall_time'], reverse=True)[:count]:
+        print(
+            "    {}: {:.2f}s ({:.2f}s in queries), {:,} rows, {:,} bytes, {}"
+            .format(
+                os.path.join(r['inputs_dir'], r['table']), r['wall_time'],
+                r['query_time'], r['rows'], r['bytes'], r['status']
+            )
+        )
+
+def install():
+    """ Make scenario_data record a profile of each table it writes. """
+    for name in arguments_pos:
+        writer = getattr(scenario_data, name)
+        if getattr(writer, 'profiled', False):
+            continue
+        writer = profiled(name, writer)
+        writer.profiled = True
+        setattr(scenario_data, name, writer)
@@ -43,14 +43,46 @@ Note: we assume the following (add code to verify):
 
 Then add the BuildGen and BuildStorageEnergy values to
 gen_build_predetermined.csv for each slice.
+
+Usage:
+
+    python interpolate_construction_plan.py
+
+reads outputs/, inputs/ and inputs_annual/ and writes
+inputs_annual/gen_build_predetermined_adjusted.csv. To process several solved
+scenarios at once, give several outputs directories (and --jobs to run them in
+parallel); {scenario} in any of the directory or file names is replaced by the
+name of each outputs directory, e.g.,
+
+    python interpolate_construction_plan.py --jobs 8 \\
+        --outputs-dir outputs_* --output-file {scenario}/gen_build_predetermined_adjusted.csv
+
+Use --sparse to write only the non-zero builds, plus gen_build_costs_adjusted.csv
+with the cost rows for those builds only. Every build in the adjusted plan is
+predetermined, so the annual model has no build decisions, and with the sparse
+files Switch only creates BuildGen and BuildStorageEnergy for the non-zero
+builds. Use them in the annual model with
+
+    --input-alias gen_build_predetermined.csv=gen_build_predetermined_adjusted.csv
+        gen_build_costs.csv=gen_build_costs_adjusted.csv
+
+Use --one-year-inputs-dir inputs_annual_{year} to also split the annual model
+into one-year models that can be solved in parallel (see one_year_models.py).
+
+Other scripts can call interpolate_construction_plan() with dataframes or
+write_adjusted_plan() with directory names.
 """
 
-import os, json, collections
+from __future__ import print_function
+import os, json, logging, argparse, multiprocessing
+import numpy as np
 import pandas as pd
 
-base_output_path = lambda *args: os.path.join('outputs', *args)
-base_input_path = lambda *args: os.path.join('inputs', *args)
-new_input_path = lambda *args: os.path.join('inputs_annual', *args)
+import one_year_models
+from switch_tables import read_csv
+
+# moves made by BuildLedger.move() are logged at debug level
+logger = logging.getLogger('interpolate_construction_plan')
 
 study_years = list(range(2020, 2046))
 # could use actual years from study like below, but some code would need to be
@@ -58,178 +90,310 @@ study_years = list(range(2020, 2046))
 # functions
 # study_years = pd.read_csv(new_input_path('periods.csv'))['INVESTMENT_PERIOD'].to_list()
 
-with open(base_output_path('heco_outlook.json')) as f:
-    targets = json.load(f)
-
-tech_group_power_targets = targets['tech_group_power_targets'] # existing projects are added later
-tech_group_energy_targets = targets['tech_group_energy_targets']
-techs_for_tech_group = targets['techs_for_tech_group']
-tech_tech_group = targets['tech_tech_group']
-
-storage_techs = [t for t in techs_for_tech_group.keys() if 'battery' in t.lower()]
-assert sorted(storage_techs)==['Battery_Bulk', 'DistBattery'], \
-    'storage techs are not as expected'
-assert all(techs_for_tech_group[t]==[t] for t in storage_techs), \
-    'Code needs to be updated for grouped storage technologies'
-
-# get build and retirement schedule from outputs dir
-# need to get periods, tech, max age, BuildGen, BuildStorageEnergy
-periods = (
-    pd.read_csv(base_input_path('periods.csv'))
-    .rename({'INVESTMENT_PERIOD': 'period'}, axis=1)
-    .set_index('period')
-)
-# TODO: use periods['period_start'] where needed instead of periods themselves
-assert all(periods.index==periods['period_start']), \
-    'New code is needed to use periods with labels that differ from period_start'
-
-build_gen = (
-    pd.read_csv(base_output_path('BuildGen.csv'))
-    .rename({'GEN_BLD_YRS_1': 'gen_proj', 'GEN_BLD_YRS_2': 'bld_yr'}, axis=1)
-    .set_index(['gen_proj', 'bld_yr'])['BuildGen']
-)
-build_storage = (
-    pd.read_csv(base_output_path('BuildStorageEnergy.csv'))
-    .rename({
-        'STORAGE_GEN_BLD_YRS_1': 'gen_proj',
-        'STORAGE_GEN_BLD_YRS_2': 'bld_yr'
-    }, axis=1)
-    .set_index(['gen_proj', 'bld_yr'])['BuildStorageEnergy']
-)
-gen_info = (
-    pd.read_csv(base_input_path('generation_projects_info.csv'))
-    .rename({'GENERATION_PROJECT': 'gen_proj'}, axis=1)
-).set_index('gen_proj')
-gen_info['tech_group'] = gen_info['gen_tech'].map(tech_tech_group)
-gen_info = gen_info[gen_info['tech_group'].notna()]
-existing_techs = (
-    pd.read_csv(base_input_path('gen_build_predetermined.csv')) \
-    .rename({'GENERATION_PROJECT': 'gen_proj'}, axis=1)
-    .set_index('gen_proj')
-    .join(gen_info, how='inner')
-    .groupby(['build_year', 'tech_group'])['gen_predetermined_cap'].sum()
-    .reset_index()
-)
-assert not any(existing_techs['tech_group'].str.contains('battery', case=False)), \
-    "Need code to deal with predetermined battery construction"
-gen_max_age = gen_info['gen_max_age']
-gen_tech_group = gen_info['tech_group']
-tech_group_max_age = (
-    gen_info.groupby('tech_group')['gen_max_age'].agg(['min', 'max', 'mean'])
-)
-assert all(tech_group_max_age['min'] == tech_group_max_age['max']), \
-    "Some technologies have mixed ages."
-tech_group_max_age = tech_group_max_age['mean']
-
-# append existing techs to tech_group_power_targets
-tech_group_power_targets = (
-    [[y, t, q] for i, y, t, q in existing_techs.itertuples()]
-    + tech_group_power_targets
-)
-
-# 1. fill in all scheduled builds
-# 2. check for extended retirements and slide forward
-# 3. when to make the outer envelope?
-# **** problem: if generation is expected to retire late and we move it to the
-# correct year (which we must do, since the annual production cost model will
-# not apply the life-extension), then we may create a capacity shortfall for a
-# few years; for now we just assume there will be enough later builds to fill it.
-
-
-# Calculate the capacity level for each tech_group
-
-# set minimum capacity:
-# early years:
-# - existing capacity + HECO outlook (early build and replacements)
-#   - may be more than Switch plan b/c early builds in HECO outlook get
-#     scheduled into next study period
-# later years:
-# - Switch capacity plan
-
-# HECO planned capacity, including pre-existing (may be a little earlier than
-# Switch because Switch groups individual years into the following investment
-# period)
-heco_power_targets = (
-    pd.DataFrame(index=techs_for_tech_group.keys(), columns=study_years)
-    .fillna(0.0)
-)
-heco_energy_targets = (
-    pd.DataFrame(index=storage_techs, columns=study_years)
-    .fillna(0.0)
-)
-for heco_targets, group_targets in [
-    (heco_power_targets, tech_group_power_targets),
-    (heco_energy_targets, tech_group_energy_targets)
-]:
-    for year, tech_group, target in group_targets:
-        # year, tech_group, target = tech_group_power_targets[0]
-        first_year = max(year, study_years[0])
-        last_year = min(
-            year + tech_group_max_age[tech_group] - 1,
-            study_years[-1]
-        )
-        heco_targets.loc[tech_group, first_year:last_year] += target
-
-# Capacity built in optimization model (includes pre-existing capacity)
-switch_power_targets = (
-    pd.DataFrame(index=techs_for_tech_group.keys(), columns=study_years)
-    .fillna(0.0)
-)
-switch_energy_targets = (
-    pd.DataFrame(index=storage_techs, columns=study_years)
-    .fillna(0.0)
-)
-
-for build_info, switch_targets in [
-    (build_gen, switch_power_targets),
-    (build_storage, switch_energy_targets)
-]:
-    for (gen, year), target in build_info.items():
-        # (gen, year), target = list(build_gen.items())[3]
-        # (gen, year), target = list(build_gen.items())[2]
-        # (gen, year), target = list(build_gen.items())[6]
-        if gen not in gen_info.index:
-            # this gen is not in a tech_group, ignore it
-            continue
-        first_year = max(year, study_years[0])
-        last_year = year + gen_max_age[gen] - 1
-        # extend to next period or end of study, as Switch does
-        if last_year < periods.index[-1]:
-            last_year = periods.index[
-                periods.index.get_loc(last_year + 1, method='backfill')
-            ] - 1
-        else:
-            last_year = study_years[-1]
-        switch_targets.loc[gen_tech_group[gen], first_year:last_year] += target
-
-# use maximum target from each source as the active target
-power_targets = pd.concat([switch_power_targets, heco_power_targets]).max(level=0)
-energy_targets = pd.concat([switch_energy_targets, heco_energy_targets]).max(level=0)
-# power_targets.loc['Battery_Bulk', :]
-# energy_targets.loc['Battery_Bulk', :]
-# switch_power_targets.loc['Battery_Bulk', :]
-# switch_energy_targets.loc['Battery_Bulk', :]
-
-# now need to smooth LargePV, OnshoreWind, OffshoreWind and Battery_Bulk
-# (leave DistPV and DistBattery on current schedule).
-# Then reschedule construction for these techs to match the power_targets.
-# All other techs: follow construction plan given by Switch (with different
-# construction plans or techs it might be necessary to shift reconstruction
-# earlier for techs built in off-years, i.e., pre-existing or built in 2022,
-# with retirement (and rebuilding) on off year)
-
 # interpolate these targets after 2022 to avoid stairsteps
 interpolate_tech_groups = ['LargePV', 'OnshoreWind', 'OffshoreWind', 'Battery_Bulk']
 # meet these targets as-is, without interpolation
 non_interpolate_tech_groups = ['DistPV', 'DistBattery']
 # all others will be built as scheduled by the optimization model
 
-# only consider relevant technologies
-power_targets = power_targets.loc[
-    interpolate_tech_groups + non_interpolate_tech_groups, :
-]
+# capacity differences smaller than this (MW or MWh) are treated as rounding
+# errors when comparing to targets
+cap_tolerance = 1e-9
+
+adjusted_plan_file = 'gen_build_predetermined_adjusted.csv'
+# build costs matching the sparse version of the adjusted plan
+adjusted_costs_file = 'gen_build_costs_adjusted.csv'
+
+def read_scenario(outputs_dir='outputs', inputs_dir='inputs', annual_inputs_dir='inputs_annual'):
+    """
+    Read the data needed by interpolate_construction_plan() from the outputs
+    and inputs directories of a solved model and the inputs directory of the
+    annual model. Returns a dict of arguments for interpolate_construction_plan().
+    """
+    with open(os.path.join(outputs_dir, 'heco_outlook.json')) as f:
+        targets = json.load(f)
+
+    # get build and retirement schedule from outputs dir
+    # need to get periods, tech, max age, BuildGen, BuildStorageEnergy
+    return dict(
+        targets=targets,
+        periods=read_csv(os.path.join(inputs_dir, 'periods.csv')),
+        build_gen=read_csv(os.path.join(outputs_dir, 'BuildGen.csv')),
+        build_storage=read_csv(os.path.join(outputs_dir, 'BuildStorageEnergy.csv')),
+        gen_info=read_csv(os.path.join(inputs_dir, 'generation_projects_info.csv')),
+        existing_builds=read_csv(os.path.join(inputs_dir, 'gen_build_predetermined.csv')),
+        annual_build_costs=read_csv(os.path.join(annual_inputs_dir, 'gen_build_costs.csv')),
+        annual_existing_builds=read_csv(os.path.join(annual_inputs_dir, 'gen_build_predetermined.csv')),
+    )
+
+def interpolate_construction_plan(
+    targets, periods, build_gen, build_storage, gen_info, existing_builds,
+    annual_build_costs, annual_existing_builds
+):
+    """
+    Return an adjusted construction plan (gen_build_predetermined table for
+    the annual model, indexed by GENERATION_PROJECT and build_year) from the
+    contents of heco_outlook.json (targets) and the tables with the matching
+    names in the solved model's inputs and outputs directories and the
+    annual model's inputs directory (see read_scenario()).
+    """
+    tech_group_power_targets = targets['tech_group_power_targets'] # existing projects are added later
+    tech_group_energy_targets = targets['tech_group_energy_targets']
+    techs_for_tech_group = targets['techs_for_tech_group']
+    tech_tech_group = targets['tech_tech_group']
+
+    storage_techs = [t for t in techs_for_tech_group.keys() if 'battery' in t.lower()]
+    assert sorted(storage_techs)==['Battery_Bulk', 'DistBattery'], \
+        'storage techs are not as expected'
+    assert all(techs_for_tech_group[t]==[t] for t in storage_techs), \
+        'Code needs to be updated for grouped storage technologies'
+
+    periods = (
+        periods
+        .rename({'INVESTMENT_PERIOD': 'period'}, axis=1)
+        .set_index('period')
+    )
+    # TODO: use periods['period_start'] where needed instead of periods themselves
+    assert all(periods.index==periods['period_start']), \
+        'New code is needed to use periods with labels that differ from period_start'
+
+    build_gen = (
+        build_gen
+        .rename({'GEN_BLD_YRS_1': 'gen_proj', 'GEN_BLD_YRS_2': 'bld_yr'}, axis=1)
+        .set_index(['gen_proj', 'bld_yr'])['BuildGen']
+    )
+    build_storage = (
+        build_storage
+        .rename({
+            'STORAGE_GEN_BLD_YRS_1': 'gen_proj',
+            'STORAGE_GEN_BLD_YRS_2': 'bld_yr'
+        }, axis=1)
+        .set_index(['gen_proj', 'bld_yr'])['BuildStorageEnergy']
+    )
+    gen_info = (
+        gen_info
+        .rename({'GENERATION_PROJECT': 'gen_proj'}, axis=1)
+    ).set_index('gen_proj')
+    gen_info['tech_group'] = gen_info['gen_tech'].map(tech_tech_group)
+    gen_info = gen_info[gen_info['tech_group'].notna()]
+    existing_techs = (
+        existing_builds
+        .rename({'GENERATION_PROJECT': 'gen_proj'}, axis=1)
+        .set_index('gen_proj')
+        .join(gen_info, how='inner')
+        .groupby(['build_year', 'tech_group'])['gen_predetermined_cap'].sum()
+        .reset_index()
+    )
+    assert not any(existing_techs['tech_group'].str.contains('battery', case=False)), \
+        "Need code to deal with predetermined battery construction"
+    tech_group_max_age = (
+        gen_info.groupby('tech_group')['gen_max_age'].agg(['min', 'max', 'mean'])
+    )
+    assert all(tech_group_max_age['min'] == tech_group_max_age['max']), \
+        "Some technologies have mixed ages."
+    tech_group_max_age = tech_group_max_age['mean']
+
+    # append existing techs to tech_group_power_targets
+    tech_group_power_targets = (
+        [[y, t, q] for i, y, t, q in existing_techs.itertuples()]
+        + tech_group_power_targets
+    )
+
+    # 1. fill in all scheduled builds
+    # 2. check for extended retirements and slide forward
+    # 3. when to make the outer envelope?
+    # **** problem: if generation is expected to retire late and we move it to the
+    # correct year (which we must do, since the annual production cost model will
+    # not apply the life-extension), then we may create a capacity shortfall for a
+    # few years; for now we just assume there will be enough later builds to fill it.
+
+    # Calculate the capacity level for each tech_group
+
+    # set minimum capacity:
+    # early years:
+    # - existing capacity + HECO outlook (early build and replacements)
+    #   - may be more than Switch plan b/c early builds in HECO outlook get
+    #     scheduled into next study period
+    # later years:
+    # - Switch capacity plan
+
+    # HECO planned capacity, including pre-existing (may be a little earlier than
+    # Switch because Switch groups individual years into the following investment
+    # period)
+    all_tech_groups = list(techs_for_tech_group.keys())
+    heco_power_targets = heco_targets(
+        tech_group_power_targets, tech_group_max_age, all_tech_groups
+    )
+    heco_energy_targets = heco_targets(
+        tech_group_energy_targets, tech_group_max_age, storage_techs
+    )
+
+    # Capacity built in optimization model (includes pre-existing capacity)
+    switch_power_targets = switch_targets(build_gen, gen_info, periods, all_tech_groups)
+    switch_energy_targets = switch_targets(build_storage, gen_info, periods, storage_techs)
+
+    # use maximum target from each source as the active target
+    power_targets = pd.concat([switch_power_targets, heco_power_targets]).groupby(level=0).max()
+    energy_targets = pd.concat([switch_energy_targets, heco_energy_targets]).groupby(level=0).max()
+
+    # now need to smooth LargePV, OnshoreWind, OffshoreWind and Battery_Bulk
+    # (leave DistPV and DistBattery on current schedule).
+    # Then reschedule construction for these techs to match the power_targets.
+    # All other techs: follow construction plan given by Switch (with different
+    # construction plans or techs it might be necessary to shift reconstruction
+    # earlier for techs built in off-years, i.e., pre-existing or built in 2022,
+    # with retirement (and rebuilding) on off year)
+
+    # only consider relevant technologies
+    power_targets = power_targets.loc[
+        interpolate_tech_groups + non_interpolate_tech_groups, :
+    ]
+    for targets in [power_targets, energy_targets]:
+        interpolate_targets(targets, periods)
+
+    # adjust construction plans to meet targets
+    build_gen_ledger = BuildLedger.from_builds(build_gen, gen_info)
+    build_storage_ledger = BuildLedger.from_builds(build_storage, gen_info)
+    for build, build_targets in [
+        (build_gen_ledger, power_targets),
+        (build_storage_ledger, energy_targets)
+    ]:
+        shift_extended_rebuilds(build, periods)
+        meet_targets(build, build_targets)
+
+    # export as predetermined build schedule for an extensive model (this can
+    # also be split into one-year models with one_year_models.py)
+    gen_build_predetermined = predetermined_plan(
+        annual_build_costs, annual_existing_builds, build_gen, build_storage,
+        gen_info, storage_techs, build_gen_ledger, build_storage_ledger
+    )
+    check_targets(gen_build_predetermined, gen_info, power_targets, energy_targets)
+    trim_excess_capacity(gen_build_predetermined, gen_info)
+    return gen_build_predetermined
+
+def predetermined_plan(
+    annual_build_costs, annual_existing_builds, build_gen, build_storage,
+    gen_info, storage_techs, build_gen_ledger, build_storage_ledger
+):
+    """
+    Return a gen_build_predetermined table with a value for every possible
+    build year in the annual model, taken from the original construction plan
+    (build_gen and build_storage) and then from the ledgers for the study
+    years of the interpolated projects in gen_info. Builds that aren't in
+    annual_build_costs are added at the end, in that order.
+    """
+    def plan_index(gens, years):
+        return pd.MultiIndex.from_arrays(
+            [np.asarray(gens, dtype=object), np.asarray(years, dtype=np.int64)],
+            names=['GENERATION_PROJECT', 'build_year']
+        )
+    def ledger_values(ledger, gens):
+        # construction in each study year by the projects in gens
+        rows = [ledger.row[g] for g in gens]
+        cols = np.array(study_years) - ledger.first_year
+        return pd.Series(
+            ledger.cap[rows][:, cols].ravel(),
+            index=plan_index(np.repeat(gens, len(study_years)), np.tile(study_years, len(gens)))
+        )
+    def plan_values(values):
+        return pd.Series(
+            values.values,
+            index=plan_index(
+                values.index.get_level_values(0), values.index.get_level_values(1)
+            )
+        )
+
+    # later values replace earlier ones for the same build
+    power = [plan_values(build_gen), ledger_values(build_gen_ledger, list(gen_info.index))]
+    storage_gens = list(gen_info.index[gen_info['tech_group'].isin(storage_techs)])
+    storage = [plan_values(build_storage), ledger_values(build_storage_ledger, storage_gens)]
+
+    # set a predetermined value for all possible build years
+    index = plan_index(annual_build_costs['GENERATION_PROJECT'], annual_build_costs['build_year'])
+    existing = annual_existing_builds.set_index(
+        plan_index(annual_existing_builds['GENERATION_PROJECT'], annual_existing_builds['build_year'])
+    ).drop(['GENERATION_PROJECT', 'build_year'], axis=1)
+    keys = power[0].index.append([storage[0].index, power[1].index])
+    new_keys = keys[~keys.duplicated() & ~keys.isin(index)]
+    gen_build_predetermined = existing.reindex(index).fillna(0.0).reindex(index.append(new_keys))
+    gen_build_predetermined['gen_predetermined_storage_energy_mwh'] = float('nan')
+    for col, values in [
+        ('gen_predetermined_cap', power),
+        ('gen_predetermined_storage_energy_mwh', storage)
+    ]:
+        col_values = gen_build_predetermined[col].values.copy()
+        for v in values:
+            col_values[gen_build_predetermined.index.get_indexer(v.index)] = v.values
+        gen_build_predetermined[col] = col_values
+    return gen_build_predetermined
+
+def capacity_online(groups, first_years, last_years, caps, index):
+    """
+    Return a DataFrame showing the total capacity online in each group in index
+    (rows) in each study year (columns), if caps[i] is online in groups[i] from
+    first_years[i] through last_years[i] (inclusive).
+
+    This is done with an event array: add each cap to its group in its first
+    year, subtract it in the year after its last year, then take the cumulative
+    sum along years. Years outside study_years are clipped off.
+    """
+    first = np.maximum(np.asarray(first_years), study_years[0]) - study_years[0]
+    last = np.minimum(np.asarray(last_years), study_years[-1]) - study_years[0]
+    caps = np.asarray(caps, dtype=float)
+    rows = pd.Index(index).get_indexer(groups)
+    assert all(rows >= 0), "Some capacity is in unknown groups."
+    keep = first <= last
+    events = np.zeros((len(index), len(study_years) + 1))
+    np.add.at(events, (rows[keep], first[keep].astype(int)), caps[keep])
+    np.add.at(events, (rows[keep], last[keep].astype(int) + 1), -caps[keep])
+    return pd.DataFrame(
+        events[:, :-1].cumsum(axis=1), index=index, columns=study_years
+    )
+
+def heco_targets(group_targets, tech_group_max_age, index):
+    """
+    Return capacity online in each tech group in index in each study year,
+    based on a list of [year, tech_group, capacity] targets from
+    heco_outlook.json.
+    """
+    years, groups, caps = (
+        zip(*group_targets) if group_targets else ([], [], [])
+    )
+    years = np.array(years, dtype=int)
+    return capacity_online(
+        groups, years, years + tech_group_max_age[list(groups)].values - 1,
+        caps, index
+    )
+
+def switch_targets(build_info, gen_info, periods, index):
+    """
+    Return capacity online in each tech group in index in each study year,
+    based on construction in the optimization model (build_info), including
+    the life extensions to the next period that Switch uses.
+    """
+    # ignore gens that are not in a tech_group
+    build_info = build_info[
+        build_info.index.get_level_values('gen_proj').isin(gen_info.index)
+    ]
+    gens = build_info.index.get_level_values('gen_proj')
+    years = build_info.index.get_level_values('bld_yr').values
+    last_years = years + gen_info['gen_max_age'][gens].values - 1
+    # extend to next period or end of study, as Switch does
+    next_period = np.searchsorted(periods.index.values, last_years + 1)
+    last_years = np.where(
+        last_years < periods.index[-1],
+        periods.index.values[np.minimum(next_period, len(periods.index) - 1)] - 1,
+        study_years[-1]
+    )
+    return capacity_online(
+        gen_info['tech_group'][gens].values, years, last_years, build_info.values, index
+    )
 
-for targets in [power_targets, energy_targets]:
+def interpolate_targets(targets, periods):
+    """
+    Replace the targets for interpolate_tech_groups between periods after 2022
+    with linear interpolations (in place).
+    """
     assert all(
         targets.loc[t, :].is_monotonic_increasing
         for t in targets.index
@@ -261,136 +425,218 @@ for targets in [power_targets, energy_targets]:
 # those won't be used in the production cost model).
 # Then slide excess capacity forward as needed to meet the targets.
 
-def move_build(build, gen_proj, cap, from_year, to_year):
-    """
-    Move construction of cap MW of gen_proj from from_year to to_year,
-    also moving any reconstructions of the same or less capacity currently
-    scheduled for the retirement year.
-
-    gen_proj = 'Oahu_Battery_Bulk'
-    tech_group = 'Battery_Bulk'
-    cap = 75
-    from_year = 2020
-    to_year = from_year - 3
-    build = collections.defaultdict(lambda: collections.defaultdict(float))
-    build[tech_group, from_year][gen_proj] = 100
-    build[tech_group, from_year+gen_max_age[gen_proj]][gen_proj] = 50
-
-    move_build(build, gen_proj, cap, from_year, to_year)
-
-    defaultdict(<function __main__.<lambda>()>,
-            {('Battery_Bulk', 2020): defaultdict(float,
-                         {'Oahu_Battery_Bulk': 25}),
-             ('Battery_Bulk', 2035): defaultdict(float,
-                         {'Oahu_Battery_Bulk': 0}),
-             ('Battery_Bulk', 2017): defaultdict(float,
-                         {'Oahu_Battery_Bulk': 75.0}),
-             ('Battery_Bulk', 2032): defaultdict(float,
-                         {'Oahu_Battery_Bulk': 50.0})})
-
-    # 2032 capacity will retire in 2047; shift to 2030 and get some rebuild
-    move_build(build, gen_proj, 30, 2032, 2030)
-    defaultdict(<function __main__.<lambda>()>,
-                {('Battery_Bulk', 2020): defaultdict(float,
-                             {'Oahu_Battery_Bulk': 25}),
-                 ('Battery_Bulk', 2035): defaultdict(float,
-                             {'Oahu_Battery_Bulk': 0}),
-                 ('Battery_Bulk', 2017): defaultdict(float,
-                             {'Oahu_Battery_Bulk': 75.0}),
-                 ('Battery_Bulk', 2032): defaultdict(float,
-                             {'Oahu_Battery_Bulk': 20.0}),
-                 ('Battery_Bulk', 2030): defaultdict(float,
-                             {'Oahu_Battery_Bulk': 30.0}),
-                 ('Battery_Bulk', 2045): defaultdict(float,
-                             {'Oahu_Battery_Bulk': 30.0})})
-    """
-    tech_group = gen_tech_group[gen_proj]
-    retire_year = from_year + gen_max_age[gen_proj]
-    new_retire_year = retire_year + (to_year - from_year)
-    build[tech_group, from_year][gen_proj] -= cap
-    build[tech_group, to_year][gen_proj] += cap
-    if retire_year <= study_years[-1]:
-        # how much of this was scheduled to be rebuilt in the original
-        # retirement year?
-        cascade_cap = min(cap, build[tech_group, retire_year][gen_proj])
-        # move that amount up to the new retirement year
-        move_build(build, gen_proj, cascade_cap, retire_year, new_retire_year)
-    elif new_retire_year <= study_years[-1]:
-        # reconstruct projects that have been moved earlier, creating gaps at
-        # the end of the study
-        build[tech_group, new_retire_year][gen_proj] += cap
-    print(
-        "Moved {} units of {} from {} to {}."
-        .format(cap, gen_proj, from_year, to_year)
+class FenwickTree(object):
+    """
+    Running totals of a list of values, with O(log n) updates and prefix-sum
+    queries (a binary indexed tree).
+    """
+    def __init__(self, values):
+        n = len(values)
+        # tree[i] holds the sum of values[i - (i & -i):i] (1-based)
+        self.tree = [0.0] + [float(v) for v in values]
+        for i in range(1, n + 1):
+            parent = i + (i & -i)
+            if parent <= n:
+                self.tree[parent] += self.tree[i]
+
+    def add(self, pos, value):
+        """ Add value to values[pos]. """
+        i = pos + 1
+        while i < len(self.tree):
+            self.tree[i] += value
+            i += i & -i
+
+    def prefix_sum(self, end):
+        """ Return the sum of values[:end]. """
+        total = 0.0
+        i = min(end, len(self.tree) - 1)
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+class BuildLedger(object):
+    """
+    Capacity built in each project (rows) in each year (columns), stored in a
+    numpy array, with a method to move construction from one year to another.
+    Years outside first_year through last_year always have zero construction.
+
+    A FenwickTree of construction by year is kept for each tech group and
+    updated with every change, so the capacity online in a tech group in any
+    year can be found in O(log years).
+    """
+    def __init__(self, gen_info, first_year, last_year):
+        self.gens = list(gen_info.index)
+        self.row = {g: i for i, g in enumerate(self.gens)}
+        self.first_year = first_year
+        self.last_year = last_year
+        self.cap = np.zeros((len(self.gens), last_year - first_year + 1))
+        self.max_age = gen_info['gen_max_age'].values
+        # rows for the projects in each tech group
+        groups = gen_info['tech_group'].values
+        self.group_rows = {
+            tg: np.flatnonzero(groups == tg) for tg in np.unique(groups)
+        }
+        self.row_group = list(groups)
+        self.index_groups()
+
+    def index_groups(self):
+        """ (Re)build the index of construction by year in each tech group. """
+        self.group_index = {
+            tg: FenwickTree(self.cap[rows, :].sum(axis=0))
+            for tg, rows in self.group_rows.items()
+        }
+
+    @classmethod
+    def from_builds(cls, build_info, gen_info):
+        """
+        Create a ledger for the projects in gen_info from a BuildGen or
+        BuildStorageEnergy series.
+        """
+        gens = build_info.index.get_level_values('gen_proj')
+        years = build_info.index.get_level_values('bld_yr')
+        build = cls(gen_info, min(years.min(), study_years[0]), study_years[-1])
+        keep = gens.isin(gen_info.index) & (build_info.values > 0)
+        np.add.at(
+            build.cap,
+            (gen_info.index.get_indexer(gens[keep]), years[keep] - build.first_year),
+            build_info.values[keep]
+        )
+        build.index_groups()
+        return build
+
+    def get(self, gen, year):
+        if self.first_year <= year <= self.last_year:
+            return self.cap[self.row[gen], year - self.first_year]
+        return 0.0
+
+    def age(self, gen):
+        return self.max_age[self.row[gen]]
+
+    def add(self, gen, year, cap):
+        row = self.row[gen]
+        self.cap[row, year - self.first_year] += cap
+        self.group_index[self.row_group[row]].add(year - self.first_year, cap)
+
+    def group_gens(self, tech_group):
+        return [self.gens[r] for r in self.group_rows.get(tech_group, [])]
+
+    def online(self, tech_group, year):
+        """ Return total capacity of tech_group in service in year. """
+        rows = self.group_rows.get(tech_group, [])
+        if len(rows) == 0:
+            return 0.0
+        age = self.max_age[rows[0]]  # all projects in a tech group have the same age
+        index = self.group_index[tech_group]
+        # capacity built from year - age + 1 through year
+        first = max(year - age + 1 - self.first_year, 0)
+        end = max(year + 1 - self.first_year, 0)
+        return index.prefix_sum(end) - index.prefix_sum(first) if first < end else 0.0
+
+    def move(self, gen, cap, from_year, to_year):
+        """
+        Move construction of cap MW of gen from from_year to to_year, also
+        moving any reconstructions of the same or less capacity currently
+        scheduled for the retirement year, and so on through the end of the
+        study. If the last retirement moves into the study, the capacity is
+        rebuilt then, to avoid opening a gap at the end of the study.
+
+        e.g., with 100 MW of Oahu_Battery_Bulk (15-year life) built in 2020
+        and 50 MW rebuilt in 2035, move('Oahu_Battery_Bulk', 75, 2020, 2017)
+        leaves 25 MW in 2020, 75 MW in 2017, 0 MW in 2035 and 50 MW in 2032;
+        then move('Oahu_Battery_Bulk', 30, 2032, 2030) leaves 20 MW in 2032,
+        30 MW in 2030 and 30 MW in 2045.
+        """
+        row = self.row[gen]
+        age = self.max_age[row]
+        shift = to_year - from_year
+        while True:
+            self.add(gen, from_year, -cap)
+            self.add(gen, to_year, cap)
+            logger.debug(
+                "Moved %s units of %s from %s to %s.", cap, gen, from_year, to_year
+            )
+            retire_year = from_year + age
+            new_retire_year = retire_year + shift
+            if retire_year <= study_years[-1]:
+                # move up as much of this as was scheduled to be rebuilt in the
+                # original retirement year
+                cap = min(cap, self.get(gen, retire_year))
+                from_year, to_year = retire_year, new_retire_year
+            else:
+                if new_retire_year <= study_years[-1]:
+                    # reconstruct projects that have been moved earlier,
+                    # creating gaps at the end of the study
+                    self.add(gen, new_retire_year, cap)
+                break
+
+def extended_rebuilds(build, periods):
+    """
+    Find mid-period retirements that Switch extended to the next period.
+    Returns arrays of rows in the ledger, capacity, old rebuild year (the next
+    period) and new rebuild year (the actual retirement year) for the
+    reconstruction that should be shifted earlier.
+
+    Each vintage is matched to its period with searchsorted: capacity built in
+    year y with age a is rebuilt in year y + a, which has been extended if that
+    falls strictly inside a period that is followed by another one. The
+    rebuild in that next period is then allocated to the extended vintages in
+    order of build year.
+    """
+    period_starts = np.asarray(periods.index.values)
+    rows, cols = np.nonzero(build.cap > 0)
+    years = cols + build.first_year
+    rebuild_years = years + build.max_age[rows].astype(int)
+    # index of the first period starting after each rebuild year
+    next_period = np.searchsorted(period_starts, rebuild_years, side='right')
+    extended = (
+        (next_period >= 1) & (next_period < len(period_starts))
+        & (rebuild_years != period_starts[np.maximum(next_period - 1, 0)])
+    )
+    rows, years, rebuild_years = rows[extended], years[extended], rebuild_years[extended]
+    cur_periods = period_starts[next_period[extended]]
+    caps = build.cap[rows, years - build.first_year]
+    shiftable_caps = np.where(
+        cur_periods <= build.last_year,
+        build.cap[rows, np.minimum(cur_periods, build.last_year) - build.first_year],
+        0.0
     )
-    return build
-
-def clean_build_dict(build):
-    """ strip out zero-value records from the build dict """
-    for k, d in list(build.items()):
-        for g, q in list(d.items()):
-            if not q:
-                del d[g]
-        if not d:
-            del build[k]
-
-# store by proj, but later need to find all projects in a particular
-# tech_group that have capacity available in a particular year, so structure
-# should be
-# build = {(tech_group, year): {gen1: amt, gen2: amt, ...}, ...}
-# retire = check build[tech_group, year-max_age][gen1]
-# To update: set build[tech_group, year][gen1]
-build_gen_dict = collections.defaultdict(lambda: collections.defaultdict(float))
-build_storage_dict = collections.defaultdict(lambda: collections.defaultdict(float))
-for (gen, year), cap in build_gen.items():
-    if gen in gen_info.index and cap > 0:
-        build_gen_dict[gen_tech_group[gen], year][gen] += cap
-for (gen, year), cap in build_storage.items():
-    if gen in gen_info.index and cap > 0:
-        build_storage_dict[gen_tech_group[gen], year][gen] += cap
-
-for build, build_targets in [
-    (build_gen_dict, power_targets),
-    (build_storage_dict, energy_targets)
-]:
-    # Find mid-period retirements and shift the subsequent reconstruction earlier
-    to_fix = []  # tuple of gen_proj, capacity, old build date, new build date
-    for prev_period, cur_period in zip(periods.index[:-1], periods.index[1:]):
-        for gen in gen_info.index:
-            # prev_period = 2040; cur_period = 2045; gen = 'Oahu_OnshoreWind_OnWind_Kahuku'; y = 2011
-            age = gen_max_age[gen]
-            tech_group = gen_tech_group[gen]
-            # build years that could have had service extended to this period
-            ext_build_years = list(range(prev_period - age + 1, cur_period - age))
-            shiftable_cap = build[tech_group, cur_period][gen]
-            for y in ext_build_years:
-                if shiftable_cap == 0:
-                    break # no possibility of shifting any more
-                shift_cap = min(build[tech_group, y][gen], shiftable_cap)
-                if shift_cap > 0:
-                    # shift this much capacity from current period to correct rebuild year
-                    to_fix.append((gen, shift_cap, cur_period, y+age))
-                    # update tally of remaining shiftable capacity
-                    shiftable_cap -= shift_cap
-    clean_build_dict(build)
-
-    # update build plan as needed (must start at latest build date so those get
-    # attached to the previous build and then move earlier when that gets moved up)
-    for gen, cap, from_year, to_year in sorted(to_fix, key=lambda x: x[2], reverse=True):
-        move_build(build, gen, cap, from_year, to_year)
-
-    # update to meet target...
-    # tech_group = 'LargePV'; target_year = 2020; target_cap = 175.69; age = 30
 
+    # apply latest rebuilds first (so those get attached to the previous build
+    # and then move earlier when that gets moved up), then by project and
+    # build year
+    order = np.lexsort((years, rows, -cur_periods))
+    rows, caps, shiftable_caps, cur_periods, rebuild_years = (
+        rows[order], caps[order], shiftable_caps[order], cur_periods[order],
+        rebuild_years[order]
+    )
+    # capacity claimed by earlier vintages of the same project for the same rebuild
+    group_start = np.ones(len(rows), dtype=bool)
+    group_start[1:] = (rows[1:] != rows[:-1]) | (cur_periods[1:] != cur_periods[:-1])
+    claimed = np.cumsum(caps) - caps
+    claimed -= claimed[np.maximum.accumulate(np.where(group_start, np.arange(len(rows)), 0))]
+    shift_caps = np.clip(shiftable_caps - claimed, 0.0, caps)
+    shifted = shift_caps > cap_tolerance
+    return rows[shifted], shift_caps[shifted], cur_periods[shifted], rebuild_years[shifted]
+
+def shift_extended_rebuilds(build, periods):
+    """
+    Shift reconstruction after mid-period retirements that Switch extended to
+    the next period earlier, to the actual retirement year.
+    """
+    for row, cap, from_year, to_year in zip(*extended_rebuilds(build, periods)):
+        build.move(build.gens[row], cap, int(from_year), int(to_year))
+
+def meet_targets(build, build_targets):
+    """
+    Move new construction in each tech group earlier as needed to meet
+    build_targets (tech groups x study years) in every year.
+    """
+    # tech_group = 'LargePV'; target_year = 2020; target_cap = 175.69; age = 30
     for tech_group, targets in build_targets.iterrows():
-        age = tech_group_max_age[tech_group]
         for target_year, target_cap in targets.items():
-            actual_cap = sum(
-                sum(d.values())
-                for (tg, y), d in build.items()
-                if tg == tech_group and y <= target_year < y + age
-            )
-            if actual_cap > target_cap:
+            actual_cap = build.online(tech_group, target_year)
+            if actual_cap > target_cap + cap_tolerance:
                 print(
                     "WARNING: installed {} capacity in {} is "
                     "{}, which exceeds target of {}."
@@ -401,7 +647,7 @@ for build, build_targets in [
             #         "installed {} capacity in {} is {}, which equals the target."
             #         .format(tech_group, target_year, actual_cap)
             #     )
-            elif actual_cap < target_cap:
+            elif actual_cap < target_cap - cap_tolerance:
                 print(
                     "installed {} capacity in {} is "
                     "{}, which is below target of {}."
@@ -411,95 +657,244 @@ for build, build_targets in [
             # find later installations (not reconstructions) in this tech_group
             # and shift them earlier
             for year in range(target_year+1, study_years[-1]+1):
-                for gen, cap in build[tech_group, year].items():
-                    if actual_cap >= target_cap:
+                for gen in build.group_gens(tech_group):
+                    if actual_cap >= target_cap - cap_tolerance:
                         break  # finished adjusting
-                    cap_added = cap - build[tech_group, year-gen_max_age[gen]][gen]
+                    cap = build.get(gen, year)
+                    cap_added = cap - build.get(gen, year-build.age(gen))
                     if cap_added > 0:
                         shift_cap = min(cap_added, target_cap-actual_cap)
-                        move_build(build, gen, shift_cap, year, target_year)
+                        build.move(gen, shift_cap, year, target_year)
                         actual_cap += shift_cap
-    clean_build_dict(build)
-
-# export as predetermined build schedule for an extensive model (could instead
-# be done for multiple one-year models)
-# set a predetermined value for all possible build years
-build_costs = (
-    pd.read_csv(new_input_path('gen_build_costs.csv'))
-    .set_index(['GENERATION_PROJECT', 'build_year'])
-)
-gen_build_predetermined = (
-    pd.read_csv(new_input_path('gen_build_predetermined.csv'))
-    .set_index(['GENERATION_PROJECT', 'build_year'])
-    .reindex(build_costs.index)  # set a value for every possible build year
-    .fillna(0.0)
-)
-gen_build_predetermined['gen_predetermined_storage_energy_mwh'] = float('nan')
-# start with original construction plan
-for (gen, year), cap in build_gen.items():
-    gen_build_predetermined.loc[(gen, year), 'gen_predetermined_cap'] = cap
-for (gen, year), cap in build_storage.items():
-    gen_build_predetermined.loc[(gen, year), 'gen_predetermined_storage_energy_mwh'] = cap
-# update interpolated projects
-for gen, tech_group in gen_tech_group.items():
-    for year in study_years:
-        cap = build_gen_dict[tech_group, year][gen]
-        gen_build_predetermined.loc[(gen, year), 'gen_predetermined_cap'] = cap
-        if tech_group in storage_techs:
-            gen_build_predetermined.loc[(gen, year), 'gen_predetermined_storage_energy_mwh'] \
-            = build_storage_dict[tech_group, year][gen]
-
-# gen_build_predetermined.loc['Oahu_Battery_Bulk', :]
-# build_storage['Oahu_Battery_Bulk']
-# build_gen['Oahu_Battery_Bulk']
-
-# check that we're actually hitting the targets
-power_online = power_targets.copy()
-power_online.loc[:, :] = 0.0
-energy_online = energy_targets.copy()
-energy_online.loc[:, :] = 0.0
-for (gen, year), (power_cap, energy_cap) in gen_build_predetermined.iterrows():
-    tech_group = gen_tech_group.get(gen, None)
-    if tech_group in power_online.index:
-        power_online.loc[tech_group, year:year+gen_max_age[gen]-1] += power_cap
-    if tech_group in energy_online.index:
-        energy_online.loc[tech_group, year:year+gen_max_age[gen]-1] += energy_cap
-assert (power_online - power_targets).abs().max().max() < 0.001, "some targets were missed"
-assert (energy_online - energy_targets).abs().max().max() < 0.001, "some targets were missed"
-
-# # check that there's never excess development
-# gen_cap_online = pd.DataFrame(index=gen_info.index, columns=study_years).fillna(0.0)
-# for (gen, year), (power_cap, energy_cap) in gen_build_predetermined.iterrows():
-#     if gen in gen_cap_online.index:
-#         gen_cap_online.loc[gen, year:year+gen_max_age[gen]-1] += power_cap
-# assert gen_cap_online.sub(gen_info['gen_capacity_limit_mw'], axis=0).max().max() < 0.000000001, "some capacity limits were exceeded"
-# max is 5.6e-14, which should be within rounding error
-
-# trim any minor excess development; report major errors
-for (gen, year), (power_cap, energy_cap) in gen_build_predetermined.iterrows():
-    if gen in gen_max_age:
-        cap_online = (
-            gen_build_predetermined
-            .loc[(gen, slice(year-gen_max_age[gen]+1, year)), 'gen_predetermined_cap']
-            .sum()
+
+def check_targets(gen_build_predetermined, gen_info, power_targets, energy_targets):
+    """ Check that the adjusted construction plan hits all the targets. """
+    build_gens = gen_build_predetermined.index.get_level_values('GENERATION_PROJECT')
+    build_years = gen_build_predetermined.index.get_level_values('build_year').values
+    build_groups = gen_info['tech_group'].reindex(build_gens).values
+    build_ages = gen_info['gen_max_age'].reindex(build_gens).values
+    for targets, col in [
+        (power_targets, 'gen_predetermined_cap'),
+        (energy_targets, 'gen_predetermined_storage_energy_mwh')
+    ]:
+        in_targets = pd.Index(targets.index).get_indexer(build_groups) >= 0
+        online = capacity_online(
+            build_groups[in_targets],
+            build_years[in_targets],
+            build_years[in_targets] + build_ages[in_targets] - 1,
+            gen_build_predetermined[col].fillna(0.0).values[in_targets],
+            targets.index
         )
-        max_cap = gen_info.loc[gen, 'gen_capacity_limit_mw']
-        excess_cap = cap_online - max_cap
-        if excess_cap > 0.00001:
-            raise ValueError(
-                'Excess capacity scheduled for {} in {}: {} > {}.'
-                .format(gen, year, cap_online, max_cap)
-            )
-        elif excess_cap > 0:
-            # make a small adjustment
+        assert (online - targets).abs().max().max() < 0.001, "some targets were missed"
+
+    # # check that there's never excess development
+    # gen_cap_online = pd.DataFrame(index=gen_info.index, columns=study_years).fillna(0.0)
+    # for (gen, year), (power_cap, energy_cap) in gen_build_predetermined.iterrows():
+    #     if gen in gen_cap_online.index:
+    #         gen_cap_online.loc[gen, year:year+gen_max_age[gen]-1] += power_cap
+    # assert gen_cap_online.sub(gen_info['gen_capacity_limit_mw'], axis=0).max().max() < 0.000000001, "some capacity limits were exceeded"
+    # max is 5.6e-14, which should be within rounding error
+
+def trailing_sums(gens, years, values, ages):
+    """
+    Return the sum of values for the same gen over build years
+    years[i] - ages[i] + 1 through years[i] (i.e., capacity online in
+    years[i]) for each row i, using cumulative sums along years for each gen.
+    """
+    codes, uniques = pd.factorize(gens)
+    first_year = years.min()
+    cum = np.zeros((len(uniques), years.max() - first_year + 2))
+    np.add.at(cum, (codes, years - first_year + 1), values)
+    cum = cum.cumsum(axis=1)
+    start = np.maximum(years - ages + 1 - first_year, 0)
+    return cum[codes, years - first_year + 1] - cum[codes, start]
+
+def trim_excess_capacity(gen_build_predetermined, gen_info):
+    """
+    Trim any minor excess development beyond each project's capacity limit
+    from gen_build_predetermined (in place); raise ValueError for major
+    errors.
+    """
+    build_gens = gen_build_predetermined.index.get_level_values('GENERATION_PROJECT')
+    build_years = gen_build_predetermined.index.get_level_values('build_year').values
+    build_ages = gen_info['gen_max_age'].reindex(build_gens).values
+    has_age = ~np.isnan(build_ages)
+    power_caps = gen_build_predetermined['gen_predetermined_cap'].values
+    cap_online = trailing_sums(
+        build_gens[has_age], build_years[has_age], power_caps[has_age],
+        build_ages[has_age].astype(int)
+    )
+    max_cap = gen_info['gen_capacity_limit_mw'].reindex(build_gens[has_age]).values
+    excess_cap = cap_online - max_cap
+    rows = np.flatnonzero(has_age)
+    if (excess_cap > 0.00001).any():
+        i = np.flatnonzero(excess_cap > 0.00001)[0]
+        raise ValueError(
+            'Excess capacity scheduled for {} in {}: {} > {}.'
+            .format(build_gens[rows[i]], build_years[rows[i]], cap_online[i], max_cap[i])
+        )
+    # make small adjustments; trimming one year also reduces the excess in
+    # later years that share its capacity, so these are done in order (there
+    # are rarely more than a few)
+    trims = dict()  # (gen, year): amount trimmed
+    for i in np.flatnonzero(excess_cap > 0):
+        gen, year, age = build_gens[rows[i]], build_years[rows[i]], build_ages[rows[i]]
+        trim = excess_cap[i] - sum(
+            t for (g, y), t in trims.items() if g == gen and year - age < y < year
+        )
+        if trim > 0:
+            trims[gen, year] = trim
+            power_cap = power_caps[rows[i]]
             gen_build_predetermined.loc[(gen, year), 'gen_predetermined_cap'] \
-                -= excess_cap
+                -= trim
             print(
                 'Reduced construction of {} in {} from {} to {}.'
-                .format(gen, year, power_cap, power_cap-excess_cap)
+                .format(gen, year, power_cap, power_cap-trim)
             )
 
-gen_build_predetermined.to_csv(
-    new_input_path('gen_build_predetermined_adjusted.csv'),
-    na_rep='.'
-)
+def sparse_plan(gen_build_predetermined, annual_build_costs):
+    """
+    Return the non-zero rows of gen_build_predetermined and the rows of
+    annual_build_costs for the same builds. gen_build_predetermined has a
+    value for every possible build, so the annual model can't choose any
+    others and they can be left out of the model entirely.
+    """
+    built = (
+        (gen_build_predetermined['gen_predetermined_cap'] != 0)
+        | (gen_build_predetermined['gen_predetermined_storage_energy_mwh'].fillna(0.0) != 0)
+    )
+    plan = gen_build_predetermined[built]
+    build_costs = annual_build_costs.set_index(['GENERATION_PROJECT', 'build_year'])
+    build_costs = build_costs[build_costs.index.isin(plan.index)]
+    return plan, build_costs
+
+def write_adjusted_plan(
+    outputs_dir='outputs', inputs_dir='inputs', annual_inputs_dir='inputs_annual',
+    output_file=None, one_year_inputs_dir=None, sparse=False
+):
+    """
+    Create an adjusted construction plan for the annual model from the
+    specified directories and save it in output_file (default is
+    gen_build_predetermined_adjusted.csv in annual_inputs_dir). If
+    one_year_inputs_dir is specified, also split the annual model into
+    one-year models in those directories ({year} is replaced by each year; see
+    one_year_models.py). If sparse is True, only write the non-zero builds,
+    plus a matching gen_build_costs_adjusted.csv in the same directory as
+    output_file; the annual model should then use these files in place of
+    gen_build_predetermined.csv and gen_build_costs.csv (e.g., via
+    --input-alias). Returns the name of the file written.
+    """
+    if output_file is None:
+        output_file = os.path.join(annual_inputs_dir, adjusted_plan_file)
+    scenario = read_scenario(outputs_dir, inputs_dir, annual_inputs_dir)
+    gen_build_predetermined = interpolate_construction_plan(**scenario)
+    if sparse:
+        plan, build_costs = sparse_plan(
+            gen_build_predetermined, scenario['annual_build_costs']
+        )
+        plan.to_csv(output_file, na_rep='.')
+        build_costs.to_csv(
+            os.path.join(os.path.dirname(output_file), adjusted_costs_file), na_rep='.'
+        )
+    else:
+        gen_build_predetermined.to_csv(output_file, na_rep='.')
+    if one_year_inputs_dir is not None:
+        one_year_models.write_one_year_models(
+            annual_inputs_dir, gen_build_predetermined, one_year_inputs_dir
+        )
+    return output_file
+
+def write_adjusted_plan_star(kwargs):
+    """ Call write_adjusted_plan(**kwargs); used as a process pool target. """
+    return write_adjusted_plan(**kwargs)
+
+def scenario_args(
+    outputs_dir, inputs_dir, annual_inputs_dir, output_file, one_year_inputs_dir,
+    sparse
+):
+    """
+    Return arguments for write_adjusted_plan() for one outputs directory,
+    replacing {scenario} in the other names with the name of the outputs
+    directory.
+    """
+    scenario = os.path.basename(os.path.normpath(outputs_dir))
+    def name(template):
+        # leave {year} for write_one_year_models()
+        return template.format(scenario=scenario, year='{year}')
+    return dict(
+        outputs_dir=outputs_dir,
+        inputs_dir=name(inputs_dir),
+        annual_inputs_dir=name(annual_inputs_dir),
+        output_file=None if output_file is None else name(output_file),
+        one_year_inputs_dir=None if one_year_inputs_dir is None else name(one_year_inputs_dir),
+        sparse=sparse,
+    )
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description='Interpolate the construction plan from solved Switch '
+            'model(s) to create gen_build_predetermined tables for annual models.'
+    )
+    parser.add_argument('--outputs-dir', nargs='+', default=['outputs'],
+        help='Outputs directory of each solved model to process (default is outputs).')
+    parser.add_argument('--inputs-dir', default='inputs',
+        help='Inputs directory of the solved model(s) (default is inputs).')
+    parser.add_argument('--annual-inputs-dir', default='inputs_annual',
+        help='Inputs directory of the annual model(s) (default is inputs_annual).')
+    parser.add_argument('--output-file', default=None,
+        help='File to write the adjusted plan to (default is {} in the annual '
+             'inputs directory). Must include {{scenario}} when processing '
+             'several outputs directories, unless the inputs directories do.'
+             .format(adjusted_plan_file))
+    parser.add_argument('--sparse', action='store_true', default=False,
+        help='Only write non-zero builds, plus a matching {} in the same '
+             'directory; use these in place of gen_build_predetermined.csv and '
+             'gen_build_costs.csv in the annual model.'
+             .format(adjusted_costs_file))
+    parser.add_argument('--one-year-inputs-dir', default=None,
+        help='Also split the annual model into one-year models that can be '
+             'solved in parallel, in directories with this name; {year} is '
+             'replaced by each year, e.g., inputs_annual_{year}.')
+    parser.add_argument('--jobs', type=int, default=1,
+        help='Number of scenarios to process at the same time (default is 1).')
+    parser.add_argument('--verbose', action='store_true', default=False,
+        help='Report every change made to the construction plan.')
+    args = parser.parse_args(args)
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO, format='%(message)s'
+    )
+    kwargs_list = [
+        scenario_args(
+            d, args.inputs_dir, args.annual_inputs_dir, args.output_file,
+            args.one_year_inputs_dir, args.sparse
+        )
+        for d in args.outputs_dir
+    ]
+    output_files = [
+        os.path.join(k['annual_inputs_dir'], adjusted_plan_file)
+        if k['output_file'] is None else k['output_file']
+        for k in kwargs_list
+    ]
+    if args.one_year_inputs_dir is not None and '{year}' not in args.one_year_inputs_dir:
+        parser.error('--one-year-inputs-dir must include {year}.')
+    if len(set(output_files)) < len(output_files):
+        parser.error(
+            'Several scenarios would write to the same file; use {scenario} '
+            'in --output-file or --annual-inputs-dir.'
+        )
+
+    if args.jobs > 1 and len(kwargs_list) > 1:
+        pool = multiprocessing.Pool(min(args.jobs, len(kwargs_list)))
+        try:
+            written = list(pool.imap_unordered(write_adjusted_plan_star, kwargs_list, 1))
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        written = [write_adjusted_plan_star(k) for k in kwargs_list]
+    for output_file in sorted(written):
+        print("Wrote {}".format(output_file))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,230 @@
+"""
+Estimate the size of the Switch model that would be built from each inputs
+directory, without writing any input files (get_scenario_data.py --dry-run).
+
+install() replaces the scenario_data writers with versions that only count the
+rows each table would have (using "SELECT count(*)" for tables built from
+queries), and keeps the few small tables needed to estimate the model
+dimensions. write_tables() runs in a temporary directory that is removed
+afterwards, then estimate() turns the row counts into rough counts of
+variables, binary variables and constraints for the modules in modules.txt,
+plus a memory estimate and a solve-time class.
+
+These are rules of thumb, meant to show whether a scenario will fit on a node
+and roughly how long it will take before committing to a long run; see
+bytes_per_component and solve_time_classes below to calibrate them.
+"""
+
+from __future__ import print_function, division
+import shutil, tempfile
+from textwrap import dedent
+
+import switch_model.hawaii.scenario_data as scenario_data
+
+# tables whose rows are kept for estimate(); all others are only counted
+data_tables = [
+    'generation_projects_info.csv', 'non_fuel_energy_sources.csv',
+    'gen_multiple_fuels.dat', 'load_zones.csv',
+]
+
+# approximate memory used by Pyomo per variable or constraint, calibrated so
+# the standard scenario comes out near the 6 GB per model instance noted in
+# options.txt, plus memory used by the solver per thread
+bytes_per_component = 1500
+solver_bytes_per_thread = 1.2 * 1024 ** 3
+
+# (maximum binary variables, description) for each solve-time class
+solve_time_classes = [
+    (0, 'LP: minutes'),
+    (20000, 'small MIP: under an hour'),
+    (200000, 'MIP: several hours'),
+    (float('inf'), 'large MIP: may be too big to solve'),
+]
+
+# rows counted for each table in the current inputs directory:
+# {table: (columns, row count, rows or None)}
+tables = dict()
+
+# scenario_data.write_tables() before this module was installed
+other_write_tables = None
+
+def query_count(query, arguments):
+    """ Return the number of rows query would produce. """
+    cur = scenario_data.db_cursor()
+    cur.execute(
+        "SELECT count(*) FROM ({}) AS dry_run_count;"
+        .format(dedent(query).strip().rstrip(';')),
+        arguments
+    )
+    return cur.fetchone()[0]
+
+def query_rows(query, arguments):
+    cur = scenario_data.db_cursor()
+    cur.execute(dedent(query), arguments)
+    rows = cur.fetchall()
+    return [d[0] for d in cur.description], rows
+
+def record(output_file, columns, rows):
+    if output_file in data_tables:
+        tables[output_file] = (columns, len(rows), rows)
+    else:
+        tables[output_file] = (columns, len(rows), None)
+
+def write_table(output_file, query, arguments):
+    if output_file in data_tables:
+        record(output_file, *query_rows(query, arguments))
+    else:
+        tables[output_file] = (None, query_count(query, arguments), None)
+
+def write_indexed_set_dat_file(output_file, set_name, query, arguments):
+    record(output_file, *query_rows(query, arguments))
+
+def write_csv_file(output_file, headers, data, arguments={}):
+    record(output_file, headers, list(data))
+
+def write_simple_csv(output_file, args_to_write, arguments):
+    values = [a for a in args_to_write if a in arguments]
+    if values:
+        tables[output_file] = (values, 1, None)
+
+def write_dat_file(output_file, args_to_write, arguments):
+    values = [a for a in args_to_write if a in arguments]
+    if values:
+        tables[output_file] = (values, len(values), None)
+
+def write_tables(args):
+    """
+    Count the rows of each table for args, without writing them. Returns
+    (table counts, estimate) and prints a summary.
+    """
+    tables.clear()
+    temp_dir = tempfile.mkdtemp(prefix='dry_run_')
+    try:
+        other_write_tables(dict(args, inputs_dir=temp_dir))
+    finally:
+        shutil.rmtree(temp_dir)
+    counts = {t: n for t, (columns, n, rows) in tables.items()}
+    size = estimate(tables)
+    print_estimate(args['inputs_dir'], counts, size)
+    return counts, size
+
+def column(table, name):
+    """ Return a list of the values in column name of a kept table. """
+    columns, n, rows = tables.get(table, (None, 0, None))
+    if not rows or name not in columns:
+        return []
+    pos = columns.index(name)
+    return [r[pos] for r in rows]
+
+def estimate(tables):
+    """ Estimate model dimensions from the table row counts and kept tables. """
+    def count(table):
+        return tables.get(table, (None, 0, None))[1]
+    timepoints = count('timepoints.csv')
+    timeseries = count('timeseries.csv')
+    periods = count('periods.csv')
+    zones = max(count('load_zones.csv'), 1)
+
+    projects = column('generation_projects_info.csv', 'GENERATION_PROJECT')
+    sources = column('generation_projects_info.csv', 'gen_energy_source')
+    unit_sizes = column('generation_projects_info.csv', 'gen_unit_size')
+    storage_efficiencies = column('generation_projects_info.csv', 'gen_storage_efficiency')
+    non_fuel = set(column('non_fuel_energy_sources.csv', 'NON_FUEL_ENERGY_SOURCES'))
+    multi_fuel_pairs = count('gen_multiple_fuels.dat')
+    variable_gen_tps = count('variable_capacity_factors.csv')
+    ev_bids = count('ev_charging_bids.csv')
+
+    fuel_projects = sum(
+        1 for s in sources if s not in non_fuel and s != 'multiple'
+    )
+    # (project, fuel) pairs for fuel-based projects
+    project_fuels = fuel_projects + multi_fuel_pairs
+    discrete_projects = sum(1 for u in unit_sizes if u is not None and u != '.')
+    storage_projects = sum(
+        1 for e in storage_efficiencies if e is not None and e != '.'
+    )
+
+    # note: every project is counted in every timepoint, so these are upper
+    # bounds (projects that retire or can't be built yet drop out)
+    gen_tps = len(projects) * timepoints
+    size = dict(
+        timepoints=timepoints,
+        timeseries=timeseries,
+        periods=periods,
+        projects=len(projects),
+        fuel_projects=fuel_projects,
+        project_fuels=project_fuels,
+        discrete_projects=discrete_projects,
+        storage_projects=storage_projects,
+        variable_gen_timepoints=variable_gen_tps,
+        # DispatchGen, CommitGen, spinning reserves (up and down)
+        dispatch_vars=4 * gen_tps,
+        # GenFuelUseRate
+        fuel_vars=project_fuels * timepoints,
+        # CommitUnits, StartupUnits and ShutdownUnits for discrete commitment,
+        # plus BuildUnits for discrete construction
+        binary_vars=3 * discrete_projects * timepoints + discrete_projects * periods,
+        # ChargeStorage, StateOfCharge
+        storage_vars=2 * storage_projects * timepoints,
+        # ChargeEVs in each zone and timepoint, plus one weight per bid and
+        # timeseries when using EV charging bids
+        ev_vars=zones * timepoints + (
+            ev_bids // timepoints * timeseries if timepoints else 0
+        ),
+    )
+    variables = sum(size[v] for v in [
+        'dispatch_vars', 'fuel_vars', 'binary_vars', 'storage_vars', 'ev_vars'
+    ])
+    # roughly two constraints per variable (bounds that depend on other
+    # variables, reserves and fuel-use curves), plus energy balance and
+    # reserve requirements in each zone and timepoint
+    constraints = 2 * variables + 3 * zones * timepoints
+    size.update(
+        variables=variables,
+        constraints=constraints,
+        model_bytes=(variables + constraints) * bytes_per_component,
+        solver_bytes_per_thread=solver_bytes_per_thread,
+        solve_time_class=next(
+            desc for limit, desc in solve_time_classes
+            if size['binary_vars'] <= limit
+        ),
+    )
+    return size
+
+def print_estimate(inputs_dir, counts, size):
+    print()
+    print("Dry run for {}:".format(inputs_dir))
+    print("    Table rows:")
+    for t in sorted(counts):
+        print("        {}: {:,}".format(t, counts[t]))
+    print("    Model dimensions:")
+    for k in [
+        'timepoints', 'timeseries', 'periods', 'projects', 'fuel_projects',
+        'project_fuels', 'discrete_projects', 'storage_projects',
+        'variable_gen_timepoints', 'dispatch_vars', 'fuel_vars', 'binary_vars',
+        'storage_vars', 'ev_vars', 'variables', 'constraints'
+    ]:
+        print("        {}: {:,}".format(k, size[k]))
+    print(
+        "    Estimated memory: {:.1f} GB for the model plus {:.1f} GB per solver thread"
+        .format(size['model_bytes'] / 1024 ** 3, size['solver_bytes_per_thread'] / 1024 ** 3)
+    )
+    print("    Solve time class: {}".format(size['solve_time_class']))
+
+def install():
+    """
+    Make scenario_data count the rows of each table and print an estimate of
+    the model size, instead of writing the tables.
+    """
+    global other_write_tables
+    for name, writer in [
+        ('write_table', write_table),
+        ('write_indexed_set_dat_file', write_indexed_set_dat_file),
+        ('write_csv_file', write_csv_file),
+        ('write_simple_csv', write_simple_csv),
+        ('write_dat_file', write_dat_file),
+    ]:
+        setattr(scenario_data, name, writer)
+    if other_write_tables is None:
+        other_write_tables = scenario_data.write_tables
+    scenario_data.write_tables = write_tables
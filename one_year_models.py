@@ -0,0 +1,203 @@
+"""
+Split the annual production-cost model (inputs_annual) into independent
+one-year models that can be solved in parallel, then merge their results.
+
+write_one_year_models() writes one self-contained inputs directory for each
+period in the annual model, holding only that period's timeseries and
+timepoints, the rows of every period- or timepoint-indexed table for that
+period, and the adjusted construction plan up to that year as
+gen_build_predetermined.csv (so every build in the one-year model is fixed).
+Tables that aren't indexed by period, timeseries, timepoint or build year are
+copied unchanged.
+
+merge_outputs() combines the outputs directories from the one-year models into
+a single outputs directory, as if from the annual model: most tables are
+concatenated (dropping rows repeated in every year, like the predetermined
+builds), and total_cost.txt and cost_components.csv are summed.
+
+Note: decisions that are made for several periods at once in the annual model,
+e.g., activating fuel supply tiers in hawaii.fuel_markets_expansion or building
+pumped hydro, are made separately for each year in the one-year models.
+
+Usage:
+
+    python interpolate_construction_plan.py --one-year-inputs-dir 'inputs_annual_{year}'
+    # (solve each inputs_annual_<year> with --outputs-dir outputs_annual_<year>)
+    python one_year_models.py outputs_annual_20?? --merged-dir outputs_annual
+"""
+
+from __future__ import print_function
+import os, csv, argparse
+
+# columns that identify the period, timeseries, timepoint or build year of
+# each row
+period_columns = {'INVESTMENT_PERIOD', 'PERIOD', 'period', 'ts_period'}
+timeseries_columns = {'TIMESERIES', 'timeseries'}
+timepoint_columns = {'TIMEPOINT', 'timepoint', 'timepoint_id'}
+build_year_columns = {'build_year'}
+
+# name used for the construction plan in the one-year models
+build_plan_file = 'gen_build_predetermined.csv'
+
+# outputs that are added up across years instead of concatenated
+# {file: number of key columns}
+summed_outputs = {'cost_components.csv': 1}
+
+# outputs that can't be merged (re-run the reporting on the merged outputs)
+unmerged_outputs = {'summary.csv'}
+
+def read_csv(path):
+    with open(path) as f:
+        rows = list(csv.reader(f))
+    return rows[0], rows[1:]
+
+def write_csv(path, header, rows):
+    with open(path, 'w') as f:
+        w = csv.writer(f, lineterminator='\n')
+        w.writerow(header)
+        w.writerows(rows)
+
+def same_year(value, year):
+    return value != '.' and float(value) == year
+
+def row_filter(header, year, timeseries, timepoints):
+    """
+    Return a function that says whether a row of a table with this header
+    belongs in the one-year model for year.
+    """
+    tests = []
+    for pos, col in enumerate(header):
+        if col in period_columns:
+            tests.append(lambda r, pos=pos: same_year(r[pos], year))
+        elif col in timeseries_columns:
+            tests.append(lambda r, pos=pos: r[pos] in timeseries)
+        elif col in timepoint_columns:
+            tests.append(lambda r, pos=pos: r[pos] in timepoints)
+        elif col in build_year_columns:
+            tests.append(lambda r, pos=pos: float(r[pos]) <= year)
+    return lambda r: all(test(r) for test in tests)
+
+def write_one_year_models(
+    annual_inputs_dir, gen_build_predetermined, dir_template='inputs_annual_{year}'
+):
+    """
+    Write a one-year inputs directory for each period in annual_inputs_dir,
+    named by filling {year} in dir_template, using gen_build_predetermined
+    (from interpolate_construction_plan()) as the construction plan. Returns
+    a list of the directories written.
+    """
+    if '{year}' not in dir_template:
+        raise ValueError('dir_template must include {year}.')
+    header, rows = read_csv(os.path.join(annual_inputs_dir, 'periods.csv'))
+    years = [int(float(r[0])) for r in rows]
+    ts_header, ts_rows = read_csv(os.path.join(annual_inputs_dir, 'timeseries.csv'))
+    tp_header, tp_rows = read_csv(os.path.join(annual_inputs_dir, 'timepoints.csv'))
+    ts_period_pos = ts_header.index('ts_period')
+    tp_ts_pos = tp_header.index('timeseries')
+    input_files = sorted(
+        f for f in os.listdir(annual_inputs_dir)
+        if os.path.isfile(os.path.join(annual_inputs_dir, f))
+        # the adjusted plan replaces the standard one
+        and f != build_plan_file and not f.startswith('gen_build_predetermined_')
+    )
+    tables = {
+        f: read_csv(os.path.join(annual_inputs_dir, f))
+        for f in input_files if f.endswith('.csv')
+    }
+
+    written = []
+    for year in years:
+        year_dir = dir_template.format(year=year)
+        if not os.path.exists(year_dir):
+            os.makedirs(year_dir)
+        timeseries = set(r[0] for r in ts_rows if same_year(r[ts_period_pos], year))
+        timepoints = set(r[0] for r in tp_rows if r[tp_ts_pos] in timeseries)
+        for f in input_files:
+            if f in tables:
+                header, rows = tables[f]
+                keep = row_filter(header, year, timeseries, timepoints)
+                write_csv(os.path.join(year_dir, f), header, [r for r in rows if keep(r)])
+            else:
+                # .txt and .dat files
+                with open(os.path.join(annual_inputs_dir, f)) as src:
+                    text = src.read()
+                with open(os.path.join(year_dir, f), 'w') as dest:
+                    dest.write(text)
+        build_years = gen_build_predetermined.index.get_level_values('build_year')
+        gen_build_predetermined[build_years <= year].to_csv(
+            os.path.join(year_dir, build_plan_file), na_rep='.'
+        )
+        written.append(year_dir)
+    print("Wrote one-year models in {}".format(dir_template.format(year='{year}')))
+    return written
+
+def merge_outputs(outputs_dirs, merged_dir):
+    """
+    Combine the outputs from the one-year models in outputs_dirs (in order)
+    into merged_dir.
+    """
+    if not os.path.exists(merged_dir):
+        os.makedirs(merged_dir)
+    names = sorted(set(f for d in outputs_dirs for f in os.listdir(d)))
+    skipped = []
+    for name in names:
+        paths = [
+            os.path.join(d, name) for d in outputs_dirs
+            if os.path.isfile(os.path.join(d, name))
+        ]
+        if name == 'total_cost.txt':
+            total = 0.0
+            for path in paths:
+                with open(path) as f:
+                    total += float(f.read().strip())
+            with open(os.path.join(merged_dir, name), 'w') as f:
+                f.write('{}\n'.format(total))
+        elif name.endswith('.csv') and name not in unmerged_outputs:
+            tables = [read_csv(path) for path in paths]
+            header = tables[0][0]
+            if any(h != header for h, rows in tables):
+                skipped.append(name)
+                continue
+            if name in summed_outputs:
+                rows = sum_rows(tables, summed_outputs[name])
+            else:
+                seen = set()
+                rows = []
+                for h, table_rows in tables:
+                    for r in table_rows:
+                        if tuple(r) not in seen:
+                            seen.add(tuple(r))
+                            rows.append(r)
+            write_csv(os.path.join(merged_dir, name), header, rows)
+        elif paths:
+            skipped.append(name)
+    print("Merged {} outputs directories into {}.".format(len(outputs_dirs), merged_dir))
+    if skipped:
+        print("Could not merge {}.".format(', '.join(skipped)))
+
+def sum_rows(tables, key_count):
+    """ Add up the values in rows with the same key columns across tables. """
+    totals = dict()
+    for header, rows in tables:
+        for r in rows:
+            key = tuple(r[:key_count])
+            values = [float(v) for v in r[key_count:]]
+            if key in totals:
+                totals[key] = [t + v for t, v in zip(totals[key], values)]
+            else:
+                totals[key] = values
+    return [list(k) + v for k, v in totals.items()]
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description='Merge outputs from one-year models made from the annual model.'
+    )
+    parser.add_argument('outputs_dirs', nargs='+',
+        help='Outputs directories of the one-year models, in order.')
+    parser.add_argument('--merged-dir', default='outputs_annual',
+        help='Directory to write the merged outputs to (default is outputs_annual).')
+    args = parser.parse_args(args)
+    merge_outputs(args.outputs_dirs, args.merged_dir)
+
+if __name__ == '__main__':
+    main()
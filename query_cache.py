@@ -0,0 +1,298 @@
+"""
+On-disk cache for the database queries run by
+switch_model.hawaii.scenario_data.write_tables().
+
+Results are stored under a content-addressed key: a hash of the query text
+with its arguments filled in (from psycopg2's mogrify(), so only the arguments
+that appear in the query matter), plus a fingerprint of the contents of any
+temporary tables the query reads (write_tables() creates study_projects,
+study_generator_info and study_length from the time sample and technology
+arguments). So queries that don't depend on the time sample (projects, fuels,
+costs, etc.) are only run once, then reused by every inputs directory and by
+later runs. When the cache grows past its size limit, the least recently used
+results are discarded.
+
+Cached results are not refreshed when the data in the database change; use
+QueryCache.clear() (get_scenario_data.py --refresh-cache) after updating the
+database.
+
+Call install() before scenario_data.write_tables() to activate the cache.
+install() with no cache directory still tracks the temporary tables, so
+query_key() can be used to identify query results (e.g., by input_manifest.py)
+without caching them.
+"""
+
+from __future__ import print_function
+import os, re, time, hashlib, pickle, tempfile, itertools
+
+import switch_model.hawaii.scenario_data as scenario_data
+
+# only plain queries are cached; anything else goes straight to the database
+cacheable_query = re.compile(r'^\s*(select|with)\b', re.IGNORECASE)
+modifying_query = re.compile(
+    r'\b(create|insert|update|delete|drop|alter|truncate)\b', re.IGNORECASE
+)
+temp_table_query = re.compile(r'create\s+temporary\s+table\s+(\w+)', re.IGNORECASE)
+
+# number of rows to retrieve from the database (and store in the cache) at a
+# time
+chunk_size = 10000
+server_cursor_count = 0
+
+# total time spent running queries and retrieving results (from the database
+# or the cache) in this process (used by input_profile.py)
+query_time = 0.0
+
+# fingerprints of the temporary tables created on the current database
+# connection (scenario_data uses one connection per process)
+temp_table_fingerprints = dict()
+
+class QueryCache(object):
+    """
+    Directory of pickled query results, with least-recently-used eviction
+    once the total size exceeds max_bytes.
+    """
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        if not os.path.exists(cache_dir):
+            try:
+                os.makedirs(cache_dir)
+            except OSError:
+                # probably created by another process at the same time
+                if not os.path.isdir(cache_dir):
+                    raise
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + '.pickle')
+
+    def get(self, key):
+        """
+        Return cached (description, chunks) for key, or None if not cached.
+        chunks is an iterator that reads lists of rows from the cache file one
+        at a time.
+        """
+        path = self.path(key)
+        try:
+            f = open(path, 'rb')
+        except (IOError, OSError):
+            return None
+        try:
+            description = pickle.load(f)
+            # mark as recently used
+            os.utime(path, None)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            f.close()
+            return None
+        def read_chunks():
+            with f:
+                while True:
+                    try:
+                        yield pickle.load(f)
+                    except EOFError:
+                        break
+        return description, read_chunks()
+
+    def put(self, key, description, chunks):
+        """
+        Store description and chunks of rows for key, passing the chunks
+        through as they are written. The result is added to the cache (and the
+        cache trimmed if needed) after the last chunk has been read.
+        """
+        # write to a temporary file and then rename, so other processes never
+        # see a partial result
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(description, f, pickle.HIGHEST_PROTOCOL)
+                for chunk in chunks:
+                    pickle.dump(chunk, f, pickle.HIGHEST_PROTOCOL)
+                    yield chunk
+            os.replace(temp_path, self.path(key))
+        finally:
+            # clean up if the caller didn't read all the rows
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        self.evict()
+
+    def entries(self):
+        """ Return a list of (mtime, size, path) for all cached results. """
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.pickle'):
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    # removed by another process
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def evict(self):
+        """ Remove least recently used results until cache fits in max_bytes. """
+        entries = self.entries()
+        total = sum(size for mtime, size, path in entries)
+        for mtime, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        """ Remove all cached results. """
+        for mtime, size, path in self.entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+def query_key(cursor, query, vars):
+    """
+    Return a key identifying the result of running query with arguments vars
+    on the database connected to cursor.
+    """
+    key = hashlib.sha1()
+    key.update(cursor.connection.dsn.encode('utf-8'))
+    # full query text with arguments filled in
+    key.update(cursor.mogrify(query, vars))
+    for table, fingerprint in sorted(temp_table_fingerprints.items()):
+        if re.search(r'\b{}\b'.format(table), query, re.IGNORECASE):
+            key.update(fingerprint.encode('utf-8'))
+    return key.hexdigest()
+
+def timed(chunks):
+    """ Pass through chunks, adding the time taken to retrieve them to query_time. """
+    global query_time
+    while True:
+        start = time.time()
+        chunk = next(chunks, None)
+        query_time += time.time() - start
+        if chunk is None:
+            break
+        yield chunk
+
+class CachingCursor(object):
+    """
+    Wrapper for a psycopg2 cursor that answers read-only queries from a
+    QueryCache when possible and passes everything else through to the
+    database. If cache is None, all queries go to the database, but temporary
+    tables are still tracked. Results of read-only queries are retrieved and
+    passed back in chunks, whether or not they are cached.
+    """
+    def __init__(self, cursor, cache):
+        self.cursor = cursor
+        self.cache = cache
+        self.rows = None  # iterator over rows of read-only queries, if any
+
+    def __getattr__(self, name):
+        # anything not defined here comes from the real cursor
+        return getattr(self.cursor, name)
+
+    def execute(self, query, vars=None):
+        global query_time
+        start = time.time()
+        try:
+            self.run_query(query, vars)
+        finally:
+            query_time += time.time() - start
+
+    def run_query(self, query, vars):
+        if cacheable_query.match(query) and not modifying_query.search(query):
+            key = None if self.cache is None else query_key(self.cursor, query, vars)
+            result = None if self.cache is None else self.cache.get(key)
+            if result is None:
+                result = self.fetch_chunks(query, vars)
+                if self.cache is not None:
+                    description, chunks = result
+                    result = (description, self.cache.put(key, description, chunks))
+            self.description, chunks = result
+            self.rowcount = -1  # not known until all rows are read
+            self.rows = itertools.chain.from_iterable(timed(chunks))
+        else:
+            self.rows = None
+            for attr in ['description', 'rowcount']:
+                self.__dict__.pop(attr, None)
+            self.cursor.execute(query, vars)
+            # record the contents of any new temporary tables, since later
+            # queries that use them depend on that
+            for table in temp_table_query.findall(query):
+                temp_table_fingerprints[table.lower()] = self.fingerprint(table)
+
+    def fetch_chunks(self, query, vars):
+        """
+        Run query on the database and return (description, chunks), where
+        chunks is an iterator that retrieves lists of up to chunk_size rows.
+        This uses a server-side cursor, so large results (e.g.,
+        ev_charging_bids.csv for the annual model) are never held in memory
+        all at once.
+        """
+        global server_cursor_count
+        server_cursor_count += 1
+        cur = self.cursor.connection.cursor(
+            name='query_cache_{}'.format(server_cursor_count)
+        )
+        cur.itersize = chunk_size
+        cur.execute(query, vars)
+        # note: description is only available after the first fetch from a
+        # server-side cursor
+        first_chunk = cur.fetchmany(chunk_size)
+        description = tuple(tuple(d) for d in cur.description)
+        def chunks():
+            chunk = first_chunk
+            while chunk:
+                yield chunk
+                chunk = cur.fetchmany(chunk_size)
+            cur.close()
+        return description, chunks()
+
+    def fingerprint(self, table):
+        """ Return a hash of the contents of the specified table. """
+        self.cursor.execute(
+            "SELECT md5(string_agg(t::text, ',' ORDER BY t::text)) FROM {} t"
+            .format(table)
+        )
+        return table + ':' + str(self.cursor.fetchone()[0])
+
+    def __iter__(self):
+        return self if self.rows is not None else iter(self.cursor)
+
+    def __next__(self):
+        return next(self.rows)
+    next = __next__  # python 2
+
+    def fetchone(self):
+        if self.rows is None:
+            return self.cursor.fetchone()
+        return next(self.rows, None)
+
+    def fetchmany(self, size=None):
+        if size is None:
+            size = self.cursor.arraysize
+        if self.rows is None:
+            return self.cursor.fetchmany(size)
+        return [r for i, r in zip(range(size), self.rows)]
+
+    def fetchall(self):
+        if self.rows is None:
+            return self.cursor.fetchall()
+        return list(self.rows)
+
+def install(cache_dir=None, max_mb=2000):
+    """
+    Make scenario_data use a query cache stored in cache_dir, limited to
+    max_mb megabytes. Returns the QueryCache object (None if cache_dir is
+    None).
+    """
+    cache = None if cache_dir is None else QueryCache(cache_dir, max_mb * 1024 * 1024)
+    uncached_db_cursor = getattr(
+        scenario_data, 'uncached_db_cursor', scenario_data.db_cursor
+    )
+    def db_cursor():
+        return CachingCursor(uncached_db_cursor(), cache)
+    scenario_data.uncached_db_cursor = uncached_db_cursor
+    scenario_data.db_cursor = db_cursor
+    return cache
@@ -0,0 +1,552 @@
+"""
+Recreate the reports from summarize_results.post_solve() for a solved model,
+using the files in its outputs and inputs directories instead of rebuilding
+the model with --reload-prior-solution.
+
+summarize_outputs() reads the saved solution (BuildGen.csv, gen_dispatch.csv,
+ChargeStorage.csv, GenFuelUseRate.csv, ConsumeFuelTier.csv, etc.) and the
+model inputs, then writes generation_project_details.csv,
+non_generation_costs_by_period.csv, annual_details_by_tech.csv and
+annual_details_by_owner.csv in the outputs directory. It checks the reported
+costs against costs_itemized.csv and total_cost.txt the same way post_solve()
+checks them against the model. Costs that are not itemized per generator
+(e.g., Pumped_Hydro_Fixed_Cost_Annual) are taken from costs_itemized.csv.
+
+Values that depend on a table that wasn't saved are left blank (e.g., fuel_cost
+and co2_emissions if there is no GenFuelUseRate.csv). Investment subsidies are
+only included if the outputs directory has gen_investment_subsidy_fraction.csv,
+which post_solve() writes when the model has subsidies. Costs that are left out
+of the reports this way are also left out of the cost checks, so the checks
+compare the remaining (e.g., pre-subsidy) costs. The comparison with EIA
+production data is not repeated. With --parquet, each report is also saved
+as a .parquet file (requires pyarrow or fastparquet).
+
+Usage:
+
+    python summarize_outputs.py
+
+reads outputs/ and inputs/ and writes the reports in outputs/. To process
+several solved scenarios, give several outputs directories (and --jobs to run
+them in parallel); {scenario} in --inputs-dir is replaced by the name of each
+outputs directory, e.g.,
+
+    python summarize_outputs.py --jobs 4 --outputs-dir outputs_* --inputs-dir inputs
+"""
+
+from __future__ import print_function
+import os, argparse, multiprocessing
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from switch_model.financials import (
+    capital_recovery_factor as crf,
+    uniform_series_to_present_value, future_to_present_value
+)
+from switch_tables import read_csv
+from summarize_results import (
+    generator_frame, non_gen_frame, check_costs, dense_array,
+    gen_period_totals, summarize_for_rist, write_table, itemized_gen_costs,
+    ratio
+)
+
+# average hours per year, as in switch_model.timescales
+hours_per_year = 8766.0
+
+# tables read by read_solution(), {name: (directory, file name, required)}
+solution_files = OrderedDict([
+    ('periods', ('inputs', 'periods.csv', True)),
+    ('timeseries', ('inputs', 'timeseries.csv', True)),
+    ('timepoints', ('inputs', 'timepoints.csv', True)),
+    ('financials', ('inputs', 'financials.csv', True)),
+    ('gen_info', ('inputs', 'generation_projects_info.csv', True)),
+    ('build_costs', ('inputs', 'gen_build_costs.csv', True)),
+    ('fuels', ('inputs', 'fuels.csv', True)),
+    ('non_fuel_energy_sources', ('inputs', 'non_fuel_energy_sources.csv', False)),
+    ('rps_targets', ('inputs', 'rps_targets.csv', False)),
+    ('loads', ('inputs', 'loads.csv', True)),
+    ('fuel_cost', ('inputs', 'fuel_cost.csv', False)),
+    ('zone_rfms', ('inputs', 'zone_to_regional_fuel_market.csv', False)),
+    ('rfm_fuels', ('inputs', 'regional_fuel_markets.csv', False)),
+    ('fuel_supply_curves', ('inputs', 'fuel_supply_curves.csv', False)),
+    ('build_gen', ('outputs', 'BuildGen.csv', True)),
+    ('build_storage', ('outputs', 'BuildStorageEnergy.csv', False)),
+    ('subsidy_fraction', ('outputs', 'gen_investment_subsidy_fraction.csv', False)),
+    ('dispatch', ('outputs', 'gen_dispatch.csv', True)),
+    ('charge_storage', ('outputs', 'ChargeStorage.csv', False)),
+    ('dispatch_renewable', ('outputs', 'DispatchGenRenewableMW.csv', False)),
+    ('startup_capacity', ('outputs', 'StartupGenCapacity.csv', False)),
+    ('fuel_use', ('outputs', 'GenFuelUseRate.csv', False)),
+    ('consume_fuel_tier', ('outputs', 'ConsumeFuelTier.csv', False)),
+    ('charge_evs', ('outputs', 'ChargeEVs.csv', False)),
+    ('pumped_hydro_store', ('outputs', 'PumpedHydroProjStoreMW.csv', False)),
+    ('pumped_hydro_generate', ('outputs', 'PumpedHydroProjGenerateMW.csv', False)),
+    ('costs_itemized', ('outputs', 'costs_itemized.csv', True)),
+])
+
+def read_solution(outputs_dir='outputs', inputs_dir='inputs'):
+    """
+    Read the tables needed by summary_tables() from the outputs and inputs
+    directories of a solved model. Returns a dict of arguments for
+    summary_tables(), with None for optional tables that don't exist.
+    """
+    dirs = dict(inputs=inputs_dir, outputs=outputs_dir)
+    tables = dict()
+    for name, (d, file, required) in solution_files.items():
+        path = os.path.join(dirs[d], file)
+        if required or os.path.exists(path):
+            tables[name] = read_csv(path)
+        else:
+            tables[name] = None
+    return tables
+
+def read_system_cost(outputs_dir='outputs'):
+    with open(os.path.join(outputs_dir, 'total_cost.txt')) as f:
+        return float(f.read().strip())
+
+def keyed(table):
+    """ Return the last column of table as a Series indexed by the others. """
+    return table.set_index(list(table.columns[:-1])).iloc[:, 0]
+
+def timescales(periods, timeseries, timepoints):
+    """
+    Return a table of period_start and period_length_years for each period
+    and a table of timestamp, period, tp_duration_hrs and tp_weight_in_year
+    for each timepoint, calculated as in switch_model.timescales.
+    """
+    periods = periods.set_index('INVESTMENT_PERIOD')
+    ts = timeseries.set_index('TIMESERIES').loc[timepoints['timeseries'], :]
+    tps = pd.DataFrame({
+        'timestamp': timepoints['timestamp'].values,
+        'period': ts['ts_period'].values,
+        'tp_duration_hrs': ts['ts_duration_of_tp'].values,
+        'tp_weight': ts['ts_duration_of_tp'].values * ts['ts_scale_to_period'].values,
+    }, index=timepoints['timepoint_id'].values)
+
+    # Switch adds one year to period_end if that better matches the timepoint
+    # weights (i.e., if period_end is the last year of the period)
+    hours_in_period = tps.groupby('period')['tp_weight'].sum()
+    length = periods['period_end'] - periods['period_start']
+    err_plain = (length * hours_per_year - hours_in_period).sum()
+    err_add_one = ((length + 1) * hours_per_year - hours_in_period).sum()
+    if abs(err_add_one) < abs(err_plain):
+        length = length + 1
+    periods = pd.DataFrame({
+        'period_start': periods['period_start'], 'period_length_years': length
+    })
+    tps['tp_weight_in_year'] = (
+        tps['tp_weight'] / length.loc[tps['period']].values
+    )
+    return periods, tps
+
+def annual_by_period(hourly, tps, periods):
+    """
+    Return annual totals for each period from a Series of hourly values
+    indexed by timepoint (or by other keys followed by timepoint).
+    """
+    tp = hourly.index.get_level_values(-1)
+    weighted = hourly.values * tps['tp_weight_in_year'].reindex(tp).values
+    return (
+        pd.Series(weighted).groupby(tps['period'].reindex(tp).values).sum()
+        .reindex(periods.index, fill_value=0.0)
+    )
+
+def get_zone_fuel_cost(fuel_cost, zone_rfms, rfm_fuels, fuel_supply_curves, consume_fuel_tier):
+    """
+    Return the average cost of each fuel in each load zone during each period,
+    as a Series indexed by load zone, fuel and period (see
+    summarize_results.get_zone_fuel_cost()), or None if it isn't available.
+    """
+    if fuel_supply_curves is not None and zone_rfms is not None:
+        # using fuel markets
+        if consume_fuel_tier is None:
+            return None
+        tiers = keyed(consume_fuel_tier).rename('use')
+        tiers.index.names = ['regional_fuel_market', 'period', 'tier']
+        tiers = tiers.reset_index().merge(
+            fuel_supply_curves, on=['regional_fuel_market', 'period', 'tier']
+        )
+        tiers['expend'] = tiers['use'] * tiers['unit_cost']
+        rfm = tiers.groupby(['regional_fuel_market', 'period'])[['expend', 'use']].sum()
+        rfm_fuel_cost = (rfm['expend'] / rfm['use'].replace(0.0, np.nan)).rename('cost')
+        # assign to corresponding zones and fuels
+        zone_fuel_cost = (
+            zone_rfms.merge(rfm_fuels, on='regional_fuel_market')
+            .merge(rfm_fuel_cost.reset_index(), on='regional_fuel_market')
+        )
+        return zone_fuel_cost.set_index(['load_zone', 'fuel', 'period'])['cost']
+    elif fuel_cost is not None:
+        # simple fuel costs
+        return fuel_cost.set_index(['load_zone', 'fuel', 'period'])['fuel_cost']
+    else:
+        return None
+
+def summary_tables(
+    periods, timeseries, timepoints, financials, gen_info, build_costs, fuels,
+    non_fuel_energy_sources, rps_targets, loads, fuel_cost, zone_rfms,
+    rfm_fuels, fuel_supply_curves, build_gen, build_storage, subsidy_fraction,
+    dispatch, charge_storage, dispatch_renewable, startup_capacity, fuel_use,
+    consume_fuel_tier, charge_evs, pumped_hydro_store, pumped_hydro_generate,
+    costs_itemized
+):
+    """
+    Return the generation_project_details and non_generation_costs_by_period
+    tables for a solved model, from the tables with the matching names in its
+    inputs and outputs directories (see read_solution()).
+    """
+    periods, tps = timescales(periods, timeseries, timepoints)
+    interest_rate = float(financials['interest_rate'].iloc[0])
+    gen_info = gen_info.set_index('GENERATION_PROJECT')
+    gen_info['gen_energy_source'] = gen_info['gen_energy_source'].astype(str)
+    fuel_names = set(fuels['fuel'])
+    is_storage_gen = gen_info['gen_storage_efficiency'].notnull() \
+        if 'gen_storage_efficiency' in gen_info else pd.Series(False, index=gen_info.index)
+    is_fuel_gen = gen_info['gen_energy_source'].isin(fuel_names | {'multiple'})
+
+    # capacity and capital costs for each vintage
+    builds = keyed(build_gen).rename('BuildGen').to_frame()
+    builds.index.names = ['g', 'v']
+    if build_storage is not None:
+        storage = keyed(build_storage)
+        storage.index.names = ['g', 'v']
+        builds['BuildStorageEnergy'] = storage.reindex(builds.index).fillna(0.0)
+    else:
+        builds['BuildStorageEnergy'] = 0.0
+    if subsidy_fraction is not None:
+        subsidy = keyed(subsidy_fraction)
+        subsidy.index.names = ['g', 'v']
+        builds['subsidy'] = subsidy.reindex(builds.index).fillna(0.0)
+    else:
+        builds['subsidy'] = 0.0
+    costs = build_costs.set_index(['GENERATION_PROJECT', 'build_year'])
+    costs.index.names = ['g', 'v']
+    builds = builds.join(costs).reset_index()
+    g_info = gen_info.loc[builds['g'], :]
+    builds['max_age'] = g_info['gen_max_age'].values
+    builds['is_storage'] = is_storage_gen.loc[builds['g']].values
+    builds['storage_outlay'] = np.where(
+        builds['is_storage'],
+        builds['BuildStorageEnergy'] * builds['gen_storage_energy_overnight_cost'], 0.0
+    )
+    overnight_cost = builds['gen_overnight_cost'] + g_info['gen_connect_cost_per_mw'].values
+    capital_cost_annual = overnight_cost * crf(interest_rate, builds['max_age'])
+    builds['capital_outlay'] = (
+        builds['BuildGen'] * overnight_cost * (1.0 - builds['subsidy'])
+        + builds['storage_outlay']
+    )
+    builds['amortized_cost'] = (
+        builds['BuildGen'] * capital_cost_annual
+        + builds['storage_outlay'] * crf(interest_rate, builds['max_age'])
+        - builds['subsidy'] * builds['BuildGen'] * capital_cost_annual
+    )
+
+    # vintages that can operate in each period (as in switch_model's
+    # gen_build_can_operate_in_period())
+    online = builds['v'].map(periods['period_start']).fillna(builds['v'])
+    active = builds.assign(online=online).merge(
+        periods.rename_axis('p').reset_index()[['p', 'period_start']], how='cross'
+    )
+    active = active[
+        (active['online'] <= active['period_start'])
+        & (active['period_start'] < active['online'] + active['max_age'])
+    ].sort_values(['g', 'p', 'v'])
+    active['fixed_om'] = active['BuildGen'] * active['gen_fixed_om']
+    gen_periods = active.groupby(['g', 'p'])[['BuildGen', 'fixed_om']].sum()
+
+    # annual totals of hourly values for each project (see
+    # summarize_results.annual_gen_period_sums())
+    gens = sorted(set(gen_periods.index.get_level_values('g')))
+    period_list = list(periods.index)
+    tp_list = list(tps.index)
+    tp_weights = np.zeros((len(tp_list), len(period_list)))
+    tp_weights[
+        np.arange(len(tp_list)), pd.Index(period_list).get_indexer(tps['period'])
+    ] = tps['tp_weight_in_year'].values
+    is_storage = is_storage_gen.loc[gens].values[:, np.newaxis]
+    gen_fuel_based = is_fuel_gen.loc[gens].values
+
+    def dense(table):
+        # (project x timepoint) array of the values in a Switch output table
+        if table is None:
+            return None
+        return dense_array(
+            [table.iloc[:, 0], table.iloc[:, 1]], table.iloc[:, -1].values,
+            gens, tp_list
+        )
+
+    dispatch_tps = pd.Series(tps.index, index=tps['timestamp'].values) \
+        .reindex(dispatch['timepoint_label']).values
+    dispatch_gens = list(dispatch.columns[2:])
+    gen_dispatch = np.zeros((len(gens), len(tp_list)))
+    dispatch_values = dispatch[dispatch_gens].values.T
+    gen_rows = pd.Index(gens).get_indexer(dispatch_gens)
+    tp_cols = pd.Index(tp_list).get_indexer(dispatch_tps)
+    gen_dispatch[np.ix_(gen_rows[gen_rows >= 0], tp_cols[tp_cols >= 0])] = \
+        dispatch_values[np.ix_(gen_rows >= 0, tp_cols >= 0)]
+
+    charge = dense(charge_storage)
+    if charge is None:
+        charge = np.zeros_like(gen_dispatch)
+
+    renewable = np.zeros_like(gen_dispatch)
+    if rps_targets is not None:
+        rps_sources = set(fuels.loc[fuels['rps_eligible'] == 1, 'fuel'])
+        if non_fuel_energy_sources is not None:
+            rps_sources.update(non_fuel_energy_sources.iloc[:, 0])
+        rps_gens = gen_info.loc[gens, 'gen_energy_source'].isin(rps_sources).values
+        renewable[rps_gens, :] = gen_dispatch[rps_gens, :]
+        fuel_gens = ~rps_gens & gen_fuel_based
+        renewable[fuel_gens, :] = (
+            np.nan if dispatch_renewable is None else dense(dispatch_renewable)[fuel_gens, :]
+        )
+
+    variable_om = gen_dispatch * gen_info.loc[gens, 'gen_variable_om'].values[:, np.newaxis]
+    if 'gen_startup_om' not in gen_info or (gen_info['gen_startup_om'].fillna(0.0) == 0.0).all():
+        startup_om = np.zeros_like(gen_dispatch)
+    elif startup_capacity is None:
+        startup_om = np.full_like(gen_dispatch, np.nan)
+    else:
+        startup_om = (
+            dense(startup_capacity)
+            * gen_info.loc[gens, 'gen_startup_om'].fillna(0.0).values[:, np.newaxis]
+            / tps['tp_duration_hrs'].values
+        )
+
+    # fuel cost, using the average cost for each fuel in each zone and period
+    zone_fuel_cost = get_zone_fuel_cost(
+        fuel_cost, zone_rfms, rfm_fuels, fuel_supply_curves, consume_fuel_tier
+    )
+    fuel_cost_hourly = np.zeros_like(gen_dispatch)
+    if fuel_use is None or zone_fuel_cost is None:
+        fuel_cost_hourly[gen_fuel_based, :] = np.nan
+    if fuel_use is not None:
+        use = fuel_use.copy()
+        use.columns = ['g', 't', 'f', 'use']
+        if zone_fuel_cost is not None:
+            price = zone_fuel_cost.reindex(pd.MultiIndex.from_arrays([
+                gen_info['gen_load_zone'].astype(str).reindex(use['g']).values,
+                use['f'].astype(str).values,
+                tps['period'].reindex(use['t']).values,
+            ])).values
+            with np.errstate(invalid='ignore'):
+                # avoid nan fuel prices for unused fuels
+                use['cost'] = np.where(use['use'] == 0.0, 0.0, use['use'] * price)
+            fuel_cost_hourly = dense(
+                use.groupby(['g', 't'], observed=True)['cost'].sum().reset_index()
+            )
+
+    gen_period_sums = gen_period_totals(
+        list(gen_periods.index), gens, period_list, tp_weights, is_storage,
+        gen_dispatch, charge, renewable, variable_om, startup_om, fuel_cost_hourly
+    )
+
+    gen_data = OrderedDict()
+    gen_vintage_period_data = OrderedDict()
+    capacity = gen_periods['BuildGen']
+    for r in active.itertuples():
+        g, v, p = r.g, r.v, r.p
+        if g not in gen_data:
+            gen_data[g] = OrderedDict(
+                gen_tech=gen_info.at[g, 'gen_tech'],
+                gen_load_zone=gen_info.at[g, 'gen_load_zone'],
+                gen_energy_source=gen_info.at[g, 'gen_energy_source'],
+                gen_is_intermittent=int(gen_info.at[g, 'gen_is_variable'])
+            )
+        gen_period_data = gen_period_sums[g, p]
+        gen_period_data['fixed_om'] = gen_periods.at[(g, p), 'fixed_om']
+        gen_vintage_period_data[g, v, p] = OrderedDict(
+            capacity_in_place=r.BuildGen,
+            capacity_added=r.BuildGen if p == v else 0.0,
+            capital_outlay=r.capital_outlay if p == v else 0.0,
+            amortized_cost=r.amortized_cost,
+        )
+        # allocate per-project values among the vintages based on amount
+        # of capacity currently online
+        vintage_share = ratio(r.BuildGen, capacity[g, p])
+        for var, val in gen_period_data.items():
+            gen_vintage_period_data[g, v, p][var] = vintage_share * val
+
+    # record capacity retirements
+    for r in builds.itertuples():
+        retire_year = r.v + r.max_age
+        # find the period when this retires
+        for p in period_list:
+            if p >= retire_year:
+                gen_vintage_period_data \
+                    .setdefault((r.g, r.v, p), OrderedDict())['capacity_retired'] \
+                    = r.BuildGen
+                break
+
+    generator_df = generator_frame(gen_vintage_period_data, gen_data)
+
+    # other costs and annual totals for each period
+    other_costs = costs_itemized[~costs_itemized['Component'].isin(itemized_gen_costs)]
+    # per-period components first, then per-timepoint, as in the model
+    other_costs = other_costs.sort_values('Component_type', kind='stable')
+    other_costs = OrderedDict(
+        (c, rows.set_index('PERIOD')['AnnualCost_Real'])
+        for c, rows in other_costs.groupby('Component', sort=False)
+    )
+    if fuel_use is None:
+        emissions = pd.Series(np.nan, index=periods.index)
+    else:
+        co2 = fuels.set_index('fuel')
+        co2 = co2['co2_intensity'] + co2['upstream_co2_intensity']
+        use = keyed(fuel_use)
+        tp_emissions = (
+            use * co2.reindex(use.index.get_level_values(2).astype(str)).values
+        ).groupby(level=1).sum()
+        emissions = annual_by_period(tp_emissions, tps, periods)
+    quantities = OrderedDict([
+        ('co2_emissions', emissions),
+        ('gross_load', annual_by_period(keyed(loads), tps, periods)),
+        ('ev_load', (
+            pd.Series(0.0, index=periods.index) if charge_evs is None
+            else annual_by_period(keyed(charge_evs), tps, periods)
+        )),
+    ])
+    if pumped_hydro_store is not None:
+        quantities['Pumped_Hydro_Net_Load'] = (
+            annual_by_period(keyed(pumped_hydro_store), tps, periods)
+            - annual_by_period(keyed(pumped_hydro_generate), tps, periods)
+        )
+    non_gen_costs = OrderedDict(
+        (p, OrderedDict(
+            (var, values.get(p, 0.0))
+            for var, values in list(other_costs.items()) + list(quantities.items())
+        ))
+        for p in period_list
+    )
+    non_gen_df = non_gen_frame(non_gen_costs)
+    return generator_df, non_gen_df
+
+def discount_factors(periods, financials):
+    """
+    Return bring_annual_costs_to_base_year for each period (indexed as in the
+    periods table from timescales()), as in switch_model.financials.
+    """
+    discount_rate = float(financials['discount_rate'].iloc[0])
+    base_year = float(financials['base_financial_year'].iloc[0])
+    return {
+        p: uniform_series_to_present_value(discount_rate, length)
+           * future_to_present_value(discount_rate, start - base_year)
+        for p, start, length in zip(
+            periods.index, periods['period_start'], periods['period_length_years']
+        )
+    }
+
+def summarize_outputs(outputs_dir='outputs', inputs_dir='inputs', parquet=False):
+    """
+    Write generation_project_details.csv, non_generation_costs_by_period.csv
+    and the annual_details_by_*.csv files in outputs_dir, using the solution
+    in outputs_dir and the inputs in inputs_dir, plus .parquet copies if
+    parquet is True. Returns outputs_dir.
+    """
+    tables = read_solution(outputs_dir, inputs_dir)
+    costs = tables['costs_itemized']
+    costs = costs[costs['Component'].isin(itemized_gen_costs)]
+
+    # (file, effect, cost components that can't be reported without it)
+    missing = []
+    if tables['subsidy_fraction'] is None and (
+        costs.loc[costs['Component'] == 'TotalGenCapitalCostsSubsidy', 'AnnualCost_Real'] != 0.0
+    ).any():
+        missing.append((
+            'gen_investment_subsidy_fraction.csv',
+            'investment subsidies are not included in capital_outlay and amortized_cost',
+            ['TotalGenCapitalCostsSubsidy']
+        ))
+    fuel_costs = ['FuelCostsPerPeriod', 'RFM_Fixed_Costs_Annual']
+    if tables['fuel_use'] is None:
+        missing.append((
+            'GenFuelUseRate.csv', 'fuel_cost and co2_emissions are left blank',
+            fuel_costs
+        ))
+    elif tables['fuel_supply_curves'] is not None and tables['consume_fuel_tier'] is None:
+        missing.append(('ConsumeFuelTier.csv', 'fuel_cost is left blank', fuel_costs))
+    if tables['rps_targets'] is not None and tables['dispatch_renewable'] is None:
+        missing.append((
+            'DispatchGenRenewableMW.csv',
+            'renewable_output and non_renewable_output of fuel-based projects are left blank',
+            []
+        ))
+    unreported = set()
+    for file, effect, components in missing:
+        print("NOTE: {} has no {}, so {}.".format(outputs_dir, file, effect))
+        unreported.update(components)
+    if unreported:
+        print("NOTE: cost checks for {} leave out {}.".format(
+            outputs_dir, ', '.join(sorted(unreported))
+        ))
+
+    generator_df, non_gen_df = summary_tables(**tables)
+    write_table(generator_df, outputs_dir, 'generation_project_details', parquet)
+    write_table(non_gen_df, outputs_dir, 'non_generation_costs_by_period', parquet)
+
+    # check whether reported costs match values used in the model
+    # (leaving out any costs that couldn't be reported)
+    model_costs = {
+        (c, p): v
+        for c, p, v in zip(costs['Component'], costs['PERIOD'], costs['AnnualCost_Real'])
+        if c not in unreported
+    }
+    periods, tps = timescales(tables['periods'], tables['timeseries'], tables['timepoints'])
+    factors = discount_factors(periods, tables['financials'])
+    system_cost = read_system_cost(outputs_dir) - sum(
+        factors[p] * v
+        for c, p, v in zip(costs['Component'], costs['PERIOD'], costs['AnnualCost_Real'])
+        if c in unreported
+    )
+    def warn(msg):
+        print('{}: {}'.format(outputs_dir, msg))
+    check_costs(generator_df, non_gen_df, model_costs, factors, system_cost, warn)
+
+    summarize_for_rist(
+        None, outputs_dir, non_gen_df.reset_index(), generator_df.reset_index(),
+        parquet
+    )
+    return outputs_dir
+
+def summarize_outputs_star(kwargs):
+    """ Call summarize_outputs(**kwargs); used as a process pool target. """
+    return summarize_outputs(**kwargs)
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description='Write the summarize_results reports for solved Switch '
+            'model(s) from the files in their outputs and inputs directories.'
+    )
+    parser.add_argument('--outputs-dir', nargs='+', default=['outputs'],
+        help='Outputs directory of each solved model to process (default is outputs).')
+    parser.add_argument('--inputs-dir', default='inputs',
+        help='Inputs directory of the solved model(s) (default is inputs); '
+             '{scenario} is replaced by the name of each outputs directory.')
+    parser.add_argument('--jobs', type=int, default=1,
+        help='Number of scenarios to process at the same time (default is 1).')
+    parser.add_argument('--parquet', action='store_true', default=False,
+        help='Also save the reports as .parquet files (requires pyarrow or fastparquet).')
+    args = parser.parse_args(args)
+
+    kwargs_list = [
+        dict(
+            outputs_dir=d,
+            inputs_dir=args.inputs_dir.format(
+                scenario=os.path.basename(os.path.normpath(d))
+            ),
+            parquet=args.parquet
+        )
+        for d in args.outputs_dir
+    ]
+    if args.jobs > 1 and len(kwargs_list) > 1:
+        pool = multiprocessing.Pool(min(args.jobs, len(kwargs_list)))
+        try:
+            written = list(pool.imap_unordered(summarize_outputs_star, kwargs_list, 1))
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        written = [summarize_outputs_star(k) for k in kwargs_list]
+    for outputs_dir in sorted(written):
+        print("Wrote summaries in {}".format(outputs_dir))
+
+if __name__ == '__main__':
+    main()
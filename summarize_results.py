@@ -72,10 +72,45 @@ Sum and discount to verify that these match objective fn. (also check that amort
 """
 
 import os
+import numpy as np
 import pandas as pd
-from collections import OrderedDict, defaultdict
-from pyomo.environ import value
+from collections import OrderedDict
+from pyomo.environ import value, Var, Param
 from switch_model.financials import capital_recovery_factor as crf
+from switch_tables import read_csv
+
+# List of comparisons to make in check_costs(); dict value shows which model
+# components should match which variables in generation_project_details.csv
+itemized_cost_comparisons = {
+    'gen_fixed_cost': (
+        [
+            'TotalGenFixedCosts', 'StorageEnergyFixedCost',
+            'TotalGenCapitalCostsSubsidy'
+        ],
+        ['amortized_cost', 'fixed_om']
+    ),
+    'fuel_cost': (
+        ['FuelCostsPerPeriod', 'RFM_Fixed_Costs_Annual'],
+        ['fuel_cost']
+    ),
+    'variable_om': (
+        ['GenVariableOMCostsInTP', 'Total_StartupGenCapacity_OM_Costs'],
+        ['startup_om', 'variable_om']
+    )
+}
+# list of costs that are reported per generator instead of in
+# non_generation_costs_by_period.csv
+itemized_gen_costs = set(
+    component
+    for model_costs, df_costs in itemized_cost_comparisons.values()
+    for component in model_costs
+)
+# variables in non_generation_costs_by_period.csv that aren't costs
+non_gen_quantities = ['co2_emissions', 'gross_load', 'ev_load', 'Pumped_Hydro_Net_Load']
+
+def define_arguments(argparser):
+    argparser.add_argument('--summary-parquet', action='store_true', default=False,
+        help='Also save the summary tables as .parquet files (requires pyarrow or fastparquet).')
 
 def post_solve(m, outdir):
     """ Calculate detailed costs per generation project per period. """
@@ -83,31 +118,12 @@ def post_solve(m, outdir):
     zone_fuel_cost = get_zone_fuel_cost(m)
     has_subsidies = hasattr(m, 'gen_investment_subsidy_fraction')
 
+    # annual sums of dispatch, fuel use, etc. for each project in each period
+    gen_period_sums = annual_gen_period_sums(m, zone_fuel_cost)
+
     gen_data = OrderedDict()
-    gen_period_data = OrderedDict()
     gen_vintage_period_data = OrderedDict()
     for g, p in sorted(m.GEN_PERIODS):
-        # helper function to calculate annual sums
-        def ann(expr):
-            try:
-                return sum(
-                    expr(g, t) * m.tp_weight_in_year[t]
-                    for t in m.TPS_IN_PERIOD[p]
-                )
-            except AttributeError:
-                # expression uses a component that doesn't exist
-                return None
-
-        # is this a storage gen?
-        is_storage = hasattr(m, 'STORAGE_GENS') and g in m.STORAGE_GENS
-
-        BuildGen = m.BuildGen[g, p] if (g, p) in m.GEN_BLD_YRS else 0.0
-        # BuildStorageEnergy = (
-        #     m.BuildStorageEnergy[g, p]
-        #     if is_storage and (g, p) in m.GEN_BLD_YRS
-        #     else 0.0
-        # )
-
         gen_data[g] = OrderedDict(
             gen_tech=m.gen_tech[g],
             gen_load_zone=m.gen_load_zone[g],
@@ -115,43 +131,13 @@ def post_solve(m, outdir):
             gen_is_intermittent=int(m.gen_is_variable[g])
         )
 
+        # is this a storage gen?
+        is_storage = hasattr(m, 'STORAGE_GENS') and g in m.STORAGE_GENS
+
         # temporary storage of per-generator data to be allocated per-vintage
         # below
-        gen_period_data = OrderedDict(
-            total_output=0.0 if is_storage else ann(
-                lambda g, t: m.DispatchGen[g, t]
-            ),
-            renewable_output=0.0 if is_storage else ann(
-                lambda g, t: renewable_mw(m, g, t)
-            ),
-            non_renewable_output=0.0 if is_storage else ann(
-                lambda g, t: m.DispatchGen[g, t]-renewable_mw(m, g, t)
-            ),
-            storage_load=(
-                ann(lambda g, t: m.ChargeStorage[g, t] - m.DispatchGen[g, t])
-                if is_storage else 0.0
-            ),
-            fixed_om=m.GenFixedOMCosts[g, p],
-            variable_om=ann(
-                lambda g, t: m.DispatchGen[g, t] * m.gen_variable_om[g]
-            ),
-            startup_om=ann(
-                lambda g, t:
-                m.gen_startup_om[g]
-                * m.StartupGenCapacity[g, t] / m.tp_duration_hrs[t]
-            ),
-            fuel_cost=ann(
-                lambda g, t: sum(
-                    0.0     # avoid nan fuel prices for unused fuels
-                    if m.GenFuelUseRate[g, t, f] == 0.0 else
-                    (
-                        m.GenFuelUseRate[g, t, f]
-                        * zone_fuel_cost[m.gen_load_zone[g], f, m.tp_period[t]]
-                    )
-                    for f in m.FUELS_FOR_GEN[g]
-                ) if g in m.FUEL_BASED_GENS else 0.0
-            )
-        )
+        gen_period_data = gen_period_sums[g, p]
+        gen_period_data['fixed_om'] = m.GenFixedOMCosts[g, p]
 
         for v in m.BLD_YRS_FOR_GEN_PERIOD[g, p]:
             # fill in data for each vintage of generator that is active now
@@ -189,7 +175,7 @@ def post_solve(m, outdir):
             # of capacity currently online (may not be physically meaningful if
             # gens have discrete commitment, but we assume the gens are run
             # roughly this way)
-            vintage_share = ratio(m.BuildGen[g, v], m.GenCapacity[g, p])
+            vintage_share = ratio(value(m.BuildGen[g, v]), value(m.GenCapacity[g, p]))
             for var, val in gen_period_data.items():
                 gen_vintage_period_data[g, v, p][var] = vintage_share * val
 
@@ -208,28 +194,17 @@ def post_solve(m, outdir):
                 break
 
     # convert dicts to data frames
-    generator_df = (
-        pd.DataFrame(evaluate(gen_vintage_period_data))
-        .unstack()
-        .to_frame(name='value')
-    )
-    generator_df.index.names = [
-        'generation_project', 'gen_vintage', 'period', 'variable'
-    ]
-    for g, d in gen_data.items():
-        for k, v in d.items():
-            # assign generator general data to all rows with generator==g
-            generator_df.loc[g, k] = v
-    # convert from float
-    generator_df['gen_is_intermittent'] = generator_df['gen_is_intermittent'].astype(int)
-    generator_df = generator_df.reset_index().set_index([
-        'generation_project', 'gen_vintage', 'gen_tech', 'gen_load_zone',
-        'gen_energy_source', 'gen_is_intermittent',
-        'variable'
-    ]).sort_index()
-    generator_df.to_csv(
-        os.path.join(outdir, 'generation_project_details.csv'), index=True
-    )
+    generator_df = generator_frame(evaluate(gen_vintage_period_data), gen_data)
+    parquet = m.options.summary_parquet
+    write_table(generator_df, outdir, 'generation_project_details', parquet)
+    if has_subsidies:
+        # save for summarize_outputs.py (not in the standard outputs)
+        pd.Series(
+            {k: value(v) for k, v in m.gen_investment_subsidy_fraction.items()},
+            name='gen_investment_subsidy_fraction'
+        ).rename_axis(['GEN_BLD_YRS_1', 'GEN_BLD_YRS_2']).to_csv(
+            os.path.join(outdir, 'gen_investment_subsidy_fraction.csv')
+        )
 
     # dict should be var, gen, period
     # but gens have all-years values too (technology, fuel, etc.)
@@ -238,26 +213,6 @@ def post_solve(m, outdir):
     # report other costs on an undiscounted, annualized basis
     # (custom modules, transmission, etc.)
 
-    # List of comparisons to make later; dict value shows which model
-    # components should match which variables in generator_df
-    itemized_cost_comparisons = {
-        'gen_fixed_cost': (
-            [
-                'TotalGenFixedCosts', 'StorageEnergyFixedCost',
-                'TotalGenCapitalCostsSubsidy'
-            ],
-            ['amortized_cost', 'fixed_om']
-        ),
-        'fuel_cost': (
-            ['FuelCostsPerPeriod', 'RFM_Fixed_Costs_Annual'],
-            ['fuel_cost']
-        ),
-        'variable_om': (
-            ['GenVariableOMCostsInTP', 'Total_StartupGenCapacity_OM_Costs'],
-            ['startup_om', 'variable_om']
-        )
-    }
-
     ##### most detailed level of data:
     # owner, tech, generator, fuel (if relevant, otherwise 'all' or specific fuel or 'multiple'?)
     # then aggregate up
@@ -281,85 +236,122 @@ def post_solve(m, outdir):
 
 
 
-    # list of costs that should have already been accounted for
-    itemized_gen_costs = set(
-        component
-        for model_costs, df_costs in itemized_cost_comparisons.values()
-        for component in model_costs
+    # annual value of every cost component and load total in each period,
+    # used for the report and for the cost checks
+    totals = period_totals(m)
+    if hasattr(m, 'ev_charge_min') and hasattr(m, 'ChargeEVs_min'):
+        m.logger.error(
+            'ERROR: Need to update {} to handle combined loads from '
+            'ev_simple and ev_advanced modules'.format(__name__)
+        )
+
+    non_gen_vars = [
+        var
+        for var in (
+            list(m.Cost_Components_Per_Period) + list(m.Cost_Components_Per_TP)
+            + non_gen_quantities
+        )
+        if var in totals.columns and var not in itemized_gen_costs
+    ]
+    non_gen_costs = OrderedDict(
+        (p, OrderedDict((var, totals.at[p, var]) for var in non_gen_vars))
+        for p in m.PERIODS
+    )
+    non_gen_df = non_gen_frame(non_gen_costs)
+    write_table(non_gen_df, outdir, 'non_generation_costs_by_period', parquet)
+
+    # check whether reported costs match values used in the model
+    model_costs = {
+        (cost, p): totals.at[p, cost]
+        for cost in itemized_gen_costs if cost in totals.columns
+        for p in m.PERIODS
+    }
+    check_costs(
+        generator_df, non_gen_df, model_costs,
+        {p: value(m.bring_annual_costs_to_base_year[p]) for p in m.PERIODS},
+        value(m.SystemCost), m.logger.warning
     )
 
-    non_gen_costs = OrderedDict()
-    for p in m.PERIODS:
-        non_gen_costs[p] = {
-            cost: getattr(m, cost)[p]
-            for cost in m.Cost_Components_Per_Period
-            if cost not in itemized_gen_costs
-        }
-        for cost in m.Cost_Components_Per_TP:
-            if cost not in itemized_gen_costs:
-                non_gen_costs[p][cost] = sum(
-                    getattr(m, cost)[t] * m.tp_weight_in_year[t]
-                    for t in m.TPS_IN_PERIOD[p]
-                )
-        non_gen_costs[p]['co2_emissions'] = m.AnnualEmissions[p]
-        non_gen_costs[p]['gross_load'] = ann(
-            lambda g, t: sum(m.zone_demand_mw[z, t] for z in m.LOAD_ZONES)
+    print()
+    print("TODO: *** check for missing MWh terms in {}.".format(__name__))
+    print()
+
+    summarize_for_rist(
+        m, outdir, non_gen_df.reset_index(), generator_df.reset_index(), parquet
+    )
+    compare_switch_to_eia_production(m)
+
+    # value(m.SystemCost) ==
+    # import code
+    # code.interact(local=dict(list(globals().items()) + list(locals().items())))
+
+def generator_frame(gen_vintage_period_data, gen_data):
+    """
+    Return the generation_project_details table from evaluated per-vintage
+    data ({(g, v, p): {var: value}}) and general data for each generator
+    ({g: {attribute: value}}).
+    """
+    # one row per vintage, period and variable (nan if not in the data)
+    keys = list(gen_vintage_period_data.keys())
+    variables = list(OrderedDict.fromkeys(
+        var for data in gen_vintage_period_data.values() for var in data
+    ))
+    values = np.array([
+        [data.get(var, np.nan) for var in variables]
+        for data in gen_vintage_period_data.values()
+    ], dtype=float)
+    generator_df = pd.DataFrame(
+        {'value': values.ravel()},
+        index=pd.MultiIndex.from_arrays(
+            [pd.Index(level).repeat(len(variables)) for level in zip(*keys)]
+            + [np.tile(variables, len(keys))],
+            names=['generation_project', 'gen_vintage', 'period', 'variable']
         )
-        non_gen_costs[p]['ev_load'] = 0.0
-        if hasattr(m, 'ChargeEVs'):
-            non_gen_costs[p]['ev_load'] += ann(
-                lambda g, t: sum(m.ChargeEVs[z, t] for z in m.LOAD_ZONES)
-            )
-        if hasattr(m, 'ev_charge_min') and hasattr(m, 'ChargeEVs_min'):
-            m.logger.error(
-                'ERROR: Need to update {} to handle combined loads from '
-                'ev_simple and ev_advanced modules'.format(__name__)
-            )
-        if hasattr(m, 'StorePumpedHydro'):
-            non_gen_costs[p]['Pumped_Hydro_Net_Load'] = ann(
-                lambda g, t: sum(
-                    m.StorePumpedHydro[z, t] - m.GeneratePumpedHydro[z, t]
-                    for z in m.LOAD_ZONES
-                )
-            )
+    )
+    # add generator general data to all rows for each generator
+    gen_info = pd.DataFrame.from_dict(gen_data, orient='index')
+    gen_info.index.name = 'generation_project'
+    for col in ['gen_tech', 'gen_load_zone', 'gen_energy_source']:
+        gen_info[col] = gen_info[col].astype('category')
+    gen_info['gen_is_intermittent'] = gen_info['gen_is_intermittent'].astype(int)
+    generator_df = generator_df.join(gen_info, on='generation_project')
+    generator_df = generator_df.reset_index().set_index([
+        'generation_project', 'gen_vintage', 'gen_tech', 'gen_load_zone',
+        'gen_energy_source', 'gen_is_intermittent',
+        'variable'
+    ]).sort_index()
+    return generator_df
 
-    non_gen_df = pd.DataFrame(evaluate(non_gen_costs)).unstack().to_frame(name='value')
+def non_gen_frame(non_gen_costs):
+    """
+    Return the non_generation_costs_by_period table from evaluated data for
+    each period ({p: {var: value}}).
+    """
+    non_gen_df = pd.DataFrame(non_gen_costs).unstack().to_frame(name='value')
     non_gen_df.index.names=['period', 'variable']
-    non_gen_df.to_csv(os.path.join(outdir, 'non_generation_costs_by_period.csv'))
+    return non_gen_df
 
+def check_costs(generator_df, non_gen_df, model_costs, discount_factors, system_cost, warn):
+    """
+    Call warn() with a message if costs reported in generator_df and
+    non_gen_df don't match the model: model_costs has the annual value of
+    the components in itemized_gen_costs ({(component, period): value}),
+    discount_factors has bring_annual_costs_to_base_year for each period and
+    system_cost is the NPV of all costs in the model.
+    """
+    periods = sorted(discount_factors)
     # check whether reported generator costs match values used in the model
     gen_df_totals = generator_df.groupby(['variable', 'period'])['value'].sum()
-    gen_total_costs = defaultdict(float)
-    for label, (model_costs, df_costs) in itemized_cost_comparisons.items():
-        for p in m.PERIODS:
-            for cost in model_costs:
-                if cost in m.Cost_Components_Per_Period:
-                    cost_val = value(getattr(m, cost)[p])
-                elif cost in m.Cost_Components_Per_TP:
-                    # aggregate to period
-                    cost_val = value(sum(
-                        getattr(m, cost)[t] * m.tp_weight_in_year[t]
-                        for t in m.TPS_IN_PERIOD[p]
-                    ))
-                else:
-                    cost_val = 0.0
-                gen_total_costs[label, p, 'model'] += cost_val
-            gen_total_costs[label, p, 'reported'] = (
-                gen_df_totals.loc[df_costs, p].sum()
-            )
-            mc = gen_total_costs[label, p, 'model']
-            rc = gen_total_costs[label, p, 'reported']
+    for label, (model_cost_names, df_costs) in itemized_cost_comparisons.items():
+        for p in periods:
+            mc = sum(model_costs.get((cost, p), 0.0) for cost in model_cost_names)
+            rc = gen_df_totals.loc[df_costs, p].sum()
             if different(mc, rc):
-                m.logger.warning(
+                warn(
                     "WARNING: model and reported values don't match for {} in "
                     "{}: {:,.0f} != {:,.0f}; NPV of difference: {:,.0f}."
-                    .format(label, p, mc, rc, m.bring_annual_costs_to_base_year[p]*(mc-rc))
+                    .format(label, p, mc, rc, discount_factors[p]*(mc-rc))
                 )
-            # else:
-            #     m.logger.info(
-            #         "INFO: model and reported values match for {} in "
-            #         "{}: {} == {}.".format(label, p, mc, rc)
-            #     )
 
     # check costs on an aggregated basis too (should be OK if the gen costs are)
     cost_vars = [
@@ -367,51 +359,220 @@ def post_solve(m, outdir):
         for model_costs, df_costs in itemized_cost_comparisons.values()
         for var in df_costs
     ]
-    total_costs = (
-        generator_df.loc[pd.IndexSlice[:, :, :, :, cost_vars], :]
+    gen_costs = (
+        generator_df[generator_df.index.get_level_values('variable').isin(cost_vars)]
         .groupby('period')['value'].sum()
-    ) + non_gen_df.unstack(0).drop(
-        ['co2_emissions', 'gross_load', 'Pumped_Hydro_Net_Load']
-    ).sum()
-    npv_cost = value(sum(
-        m.bring_annual_costs_to_base_year[p] * v
-        for ((_, p), v) in total_costs.iteritems()
-    ))
-    system_cost = value(m.SystemCost)
+    )
+    other_costs = (
+        non_gen_df['value'].unstack('variable')
+        .drop(non_gen_quantities, axis=1, errors='ignore').sum(axis=1)
+    )
+    total_costs = gen_costs.add(other_costs, fill_value=0.0)
+    npv_cost = sum(discount_factors[p] * v for p, v in total_costs.items())
     if different(npv_cost, system_cost):
-        m.logger.warning(
+        warn(
             "WARNING: NPV of all costs in model doesn't match reported total: "
             "{:,.0f} != {:,.0f}; difference: {:,.0f}."
             .format(npv_cost, system_cost, npv_cost - system_cost)
         )
 
+def dense_values(component, *labels):
+    """
+    Return a numpy array of the values of an indexed Pyomo component, with
+    one axis for each position in the component's index, ordered as in the
+    corresponding element of labels (see dense_array()).
+    """
+    if isinstance(component, (Var, Param)):
+        values = component.extract_values()
+    else:
+        # Expression.extract_values() returns the unevaluated expressions
+        values = {k: value(v) for k, v in component.items()}
+    if not values:
+        return np.zeros(tuple(len(l) for l in labels))
+    if len(labels) == 1:
+        keys = [list(values.keys())]
+    else:
+        keys = [list(k) for k in zip(*values.keys())]
+    return dense_array(keys, list(values.values()), *labels)
 
-    print()
-    print("TODO: *** check for missing MWh terms in {}.".format(__name__))
-    print()
+def dense_array(keys, values, *labels):
+    """
+    Return a numpy array of values, with one axis for each list of keys (one
+    key per value), ordered as in the corresponding element of labels.
+    Elements that aren't in keys are zero, and values with keys that aren't
+    in labels are skipped.
+    """
+    result = np.zeros(tuple(len(l) for l in labels))
+    idx = tuple(pd.Index(l).get_indexer(k) for l, k in zip(labels, keys))
+    found = np.logical_and.reduce([i >= 0 for i in idx])
+    # note: unset variables (None) become nan
+    result[tuple(i[found] for i in idx)] = np.array(values, dtype=float)[found]
+    return result
+
+def tp_weight_array(m, periods, tps):
+    """
+    Return a (timepoint x period) array of tp_weight_in_year, with zeros for
+    timepoints outside each period; hourly.dot() this gives annual totals.
+    """
+    period_pos = {p: i for i, p in enumerate(periods)}
+    tp_pos = {t: i for i, t in enumerate(tps)}
+    tp_weights = np.zeros((len(tps), len(periods)))
+    for p in periods:
+        for t in m.TPS_IN_PERIOD[p]:
+            tp_weights[tp_pos[t], period_pos[p]] = value(m.tp_weight_in_year[t])
+    return tp_weights
+
+def period_totals(m):
+    """
+    Return a (period x component) table of the annual value of each cost
+    component in the model, plus the annual gross_load, ev_load,
+    Pumped_Hydro_Net_Load (if used) and co2_emissions.
 
-    summarize_for_rist(m, outdir)
-    compare_switch_to_eia_production(m)
+    Each component is evaluated once: per-timepoint values are read into a
+    (component x timepoint) array, then converted to annual totals for all
+    periods at once.
+    """
+    periods = list(m.PERIODS)
+    tps = list(m.TIMEPOINTS)
+    zones = list(m.LOAD_ZONES)
+    hourly = OrderedDict(
+        (cost, dense_values(getattr(m, cost), tps))
+        for cost in m.Cost_Components_Per_TP
+    )
+    hourly['gross_load'] = dense_values(m.zone_demand_mw, zones, tps).sum(axis=0)
+    if hasattr(m, 'ChargeEVs'):
+        hourly['ev_load'] = dense_values(m.ChargeEVs, zones, tps).sum(axis=0)
+    if hasattr(m, 'StorePumpedHydro'):
+        hourly['Pumped_Hydro_Net_Load'] = (
+            dense_values(m.StorePumpedHydro, zones, tps)
+            - dense_values(m.GeneratePumpedHydro, zones, tps)
+        ).sum(axis=0)
+    totals = pd.DataFrame(
+        np.array(list(hourly.values())).dot(tp_weight_array(m, periods, tps)).T,
+        index=periods, columns=list(hourly.keys())
+    )
+    if 'ev_load' not in totals.columns:
+        totals['ev_load'] = 0.0
+    for cost in m.Cost_Components_Per_Period:
+        totals[cost] = [value(getattr(m, cost)[p]) for p in periods]
+    totals['co2_emissions'] = [value(m.AnnualEmissions[p]) for p in periods]
+    return totals
+
+def annual_gen_period_sums(m, zone_fuel_cost):
+    """
+    Return a dict with an OrderedDict of annual totals of output, storage load,
+    variable O&M, startup O&M and fuel cost for each (project, period).
 
-    # value(m.SystemCost) ==
-    # import code
-    # code.interact(local=dict(list(globals().items()) + list(locals().items())))
+    The hourly values are read once into dense (project x timepoint) arrays,
+    then the annual totals are calculated for all projects and periods at once
+    by multiplying by a (timepoint x period) array of tp_weight_in_year.
+    """
+    gens = sorted(set(g for g, p in m.GEN_PERIODS))
+    periods = list(m.PERIODS)
+    tps = list(m.TIMEPOINTS)
+    gen_pos = {g: i for i, g in enumerate(gens)}
+    period_pos = {p: i for i, p in enumerate(periods)}
+
+    tp_weights = tp_weight_array(m, periods, tps)
+
+    is_storage = np.array([
+        hasattr(m, 'STORAGE_GENS') and g in m.STORAGE_GENS for g in gens
+    ])[:, np.newaxis]
+    dispatch = dense_values(m.DispatchGen, gens, tps)
+    charge = (
+        dense_values(m.ChargeStorage, gens, tps)
+        if hasattr(m, 'ChargeStorage') else np.zeros_like(dispatch)
+    )
+    # renewable production: DispatchGen for projects using RPS energy sources,
+    # DispatchGenRenewableMW for other fuel-based projects, zero for the rest
+    # (and zero for all if there's no RPS)
+    renewable = np.zeros_like(dispatch)
+    if hasattr(m, 'RPS_ENERGY_SOURCES'):
+        rps_gens = [gen_pos[g] for g in gens if m.gen_energy_source[g] in m.RPS_ENERGY_SOURCES]
+        renewable[rps_gens, :] = dispatch[rps_gens, :]
+        fuel_gens = [
+            gen_pos[g] for g in gens
+            if m.gen_energy_source[g] not in m.RPS_ENERGY_SOURCES
+            and g in m.FUEL_BASED_GENS
+        ]
+        if fuel_gens:
+            renewable[fuel_gens, :] = dense_values(
+                m.DispatchGenRenewableMW, gens, tps
+            )[fuel_gens, :]
+    try:
+        variable_om = dispatch * np.array([value(m.gen_variable_om[g]) for g in gens])[:, np.newaxis]
+    except AttributeError:
+        variable_om = None
+    try:
+        startup_om = (
+            dense_values(m.StartupGenCapacity, gens, tps)
+            * np.array([value(m.gen_startup_om[g]) for g in gens])[:, np.newaxis]
+            / np.array([value(m.tp_duration_hrs[t]) for t in tps])
+        )
+    except AttributeError:
+        startup_om = None
+
+    # fuel cost, using the average cost for each fuel in each zone and period
+    fuels = sorted(set(f for g in m.FUEL_BASED_GENS for f in m.FUELS_FOR_GEN[g]))
+    fuel_pos = {f: i for i, f in enumerate(fuels)}
+    fuel_use = dense_values(m.GenFuelUseRate, gens, tps, fuels)
+    fuel_price = np.zeros((len(gens), len(periods), len(fuels)))
+    for g in m.FUEL_BASED_GENS:
+        if g in gen_pos:
+            for f in m.FUELS_FOR_GEN[g]:
+                for p in periods:
+                    fuel_price[gen_pos[g], period_pos[p], fuel_pos[f]] = \
+                        value(zone_fuel_cost[m.gen_load_zone[g], f, p])
+    tp_period = np.array([period_pos[m.tp_period[t]] for t in tps], dtype=np.int64)
+    with np.errstate(invalid='ignore'):
+        # avoid nan fuel prices for unused fuels
+        fuel_cost = np.where(
+            fuel_use == 0.0, 0.0, fuel_use * fuel_price[:, tp_period, :]
+        ).sum(axis=2)
+
+    return gen_period_totals(
+        m.GEN_PERIODS, gens, periods, tp_weights, is_storage,
+        dispatch, charge, renewable, variable_om, startup_om, fuel_cost
+    )
+
+def gen_period_totals(
+    gen_periods, gens, periods, tp_weights, is_storage,
+    dispatch, charge, renewable, variable_om, startup_om, fuel_cost
+):
+    """
+    Return a dict with an OrderedDict of annual totals for each (project,
+    period) in gen_periods, from (project x timepoint) arrays of hourly values
+    (or None if a value isn't available), ordered as in gens. tp_weights is a
+    (timepoint x period) array of tp_weight_in_year and is_storage is a
+    (project x 1) array showing which projects are storage.
+    """
+    gen_pos = {g: i for i, g in enumerate(gens)}
+    period_pos = {p: i for i, p in enumerate(periods)}
+    annual = OrderedDict([
+        ('total_output', np.where(is_storage, 0.0, dispatch)),
+        ('renewable_output', np.where(is_storage, 0.0, renewable)),
+        ('non_renewable_output', np.where(is_storage, 0.0, dispatch - renewable)),
+        ('storage_load', np.where(is_storage, charge - dispatch, 0.0)),
+        ('variable_om', variable_om),
+        ('startup_om', startup_om),
+        ('fuel_cost', fuel_cost),
+    ])
+    annual = OrderedDict(
+        (var, None if hourly is None else hourly.dot(tp_weights))
+        for var, hourly in annual.items()
+    )
+    return {
+        (g, p): OrderedDict(
+            (var, None if totals is None else totals[gen_pos[g], period_pos[p]])
+            for var, totals in annual.items()
+        )
+        for g, p in gen_periods
+    }
 
 def different(v1, v2):
     """ True if v1 and v2 differ by more than 0.000001 * their average value """
     return abs(v1 - v2) > 0.0000005 * (v1 + v2)
 
-def renewable_mw(m, g, t):
-    if not hasattr(m, "RPS_ENERGY_SOURCES"):
-        return 0.0
-    elif m.gen_energy_source[g] in m.RPS_ENERGY_SOURCES:
-        return m.DispatchGen[g, t]
-    elif g in m.FUEL_BASED_GENS:
-        return m.DispatchGenRenewableMW[g, t]
-    else:
-        return 0.0
-
-
 def ratio(x, y):
     """ Return ratio of x/y, giving 0 if x is 0, even if y is 0 """
     return 0.0 if x == 0.0 else x / y
@@ -427,7 +588,8 @@ def evaluate(d):
 
 def get_zone_fuel_cost(m):
     """
-    Calculate average cost of each fuel in each load zone during each period
+    Calculate average cost of each fuel in each load zone during each period,
+    from the solved values of ConsumeFuelTier if using fuel markets
     """
     if hasattr(m, 'REGIONAL_FUEL_MARKETS'):
         # using fuel markets
@@ -436,7 +598,7 @@ def get_zone_fuel_cost(m):
         rfm_fuel_expend = {
             (rfm, p):
             sum(
-                m.ConsumeFuelTier[rfm_st] * m.rfm_supply_tier_cost[rfm_st]
+                value(m.ConsumeFuelTier[rfm_st]) * value(m.rfm_supply_tier_cost[rfm_st])
                 for rfm_st in m.SUPPLY_TIERS_FOR_RFM_PERIOD[rfm, p]
             )
             for rfm in m.REGIONAL_FUEL_MARKETS for p in m.PERIODS
@@ -444,7 +606,7 @@ def get_zone_fuel_cost(m):
         rfm_fuel_use = {
             (rfm, p):
             sum(
-                m.ConsumeFuelTier[rfm_st]
+                value(m.ConsumeFuelTier[rfm_st])
                 for rfm_st in m.SUPPLY_TIERS_FOR_RFM_PERIOD[rfm, p]
             )
             for rfm in m.REGIONAL_FUEL_MARKETS for p in m.PERIODS
@@ -463,18 +625,36 @@ def get_zone_fuel_cost(m):
         }
     else:
         # simple fuel costs
-        zone_fuel_cost = {(z, f, p): m.fuel_cost[z, f, p]}
+        zone_fuel_cost = {k: value(v) for k, v in m.fuel_cost.items()}
     return zone_fuel_cost
 
     # outdir='outputs'
     # summarize_for_rist(m, outdir)
-def summarize_for_rist(m, outdir=''):
-    non_gen_df = pd.read_csv(
-        os.path.join(outdir, 'non_generation_costs_by_period.csv')
-    ).set_index(['variable', 'period'])['value'].unstack()
-    gen_df = pd.read_csv(
-        os.path.join(outdir, 'generation_project_details.csv')
-    )
+def summarize_for_rist(m, outdir='', non_gen_df=None, gen_df=None, parquet=False):
+    """
+    Write annual_details_by_tech and annual_details_by_owner tables to outdir.
+    non_gen_df and gen_df should have the same columns as
+    non_generation_costs_by_period.csv and generation_project_details.csv;
+    if omitted, they are read from those files in outdir.
+    """
+    if non_gen_df is None:
+        non_gen_df = read_csv(
+            os.path.join(outdir, 'non_generation_costs_by_period.csv')
+        )
+    if gen_df is None:
+        gen_df = read_csv(
+            os.path.join(outdir, 'generation_project_details.csv')
+        )
+    tech_df, owner_df = rist_summaries(non_gen_df, gen_df)
+    write_table(tech_df, outdir, 'annual_details_by_tech', parquet)
+    write_table(owner_df, outdir, 'annual_details_by_owner', parquet)
+
+def rist_summaries(non_gen_df, gen_df):
+    """
+    Return annual details by owner, variable, technology and vintage, and
+    totals by owner and variable, for the RIST workbook.
+    """
+    non_gen_df = non_gen_df.set_index(['variable', 'period'])['value'].unstack()
     techs_for_owner = dict(
         PPA=['AES', 'Battery_Bulk', 'CC_152', 'CentralTrackingPV',
            'H-Power', 'IC_Barge', 'IC_MCBH',
@@ -491,8 +671,14 @@ def summarize_for_rist(m, outdir=''):
         distributed=['DistBattery', 'FlatDistPV', 'SlopedDistPV']
     )
     owner_for_tech = {t: o for o, techs in techs_for_owner.items() for t in techs}
-    gen_df['owner'] = gen_df['gen_tech'].replace(owner_for_tech)
     gen_cols = ['owner', 'variable', 'gen_tech', 'gen_vintage', 'gen_is_intermittent', 'period']
+    # use plain strings for the grouping columns (post_solve passes gen_tech
+    # as a categorical), since rows with new values get added below
+    gen_df = gen_df.assign(
+        gen_tech=gen_df['gen_tech'].astype(str),
+        variable=gen_df['variable'].astype(str),
+    )
+    gen_df['owner'] = gen_df['gen_tech'].replace(owner_for_tech)
     gen_df = gen_df.groupby(gen_cols)['value'].sum().unstack()
     gen_df.loc[('PPA', 'ppa_cost', 'PumpedHydro', '', 0), :] \
         = non_gen_df.loc['Pumped_Hydro_Fixed_Cost_Annual', :]
@@ -506,16 +692,28 @@ def summarize_for_rist(m, outdir=''):
     # carry other values forward to the end of the period
     period_edges = non_gen_df.columns.to_list() + [2050]
     for start, end in zip(period_edges[:-1], period_edges[1:]):
-        gen_df.update(
-            gen_df.loc[:, start:end-1].fillna(method='ffill', axis=1)
-        )
+        gen_df.update(gen_df.loc[:, start:end-1].ffill(axis=1))
     gen_df = gen_df.sort_index()
     # drop zeros and then drop all-nan rows
     gen_df = gen_df.replace(0, float('nan')).dropna(how='all')
-    gen_df.to_csv(os.path.join(outdir, 'annual_details_by_tech.csv'))
 
     var_df = gen_df.groupby(['owner', 'variable']).sum()
-    var_df.to_csv(os.path.join(outdir, 'annual_details_by_owner.csv'))
+    return gen_df, var_df
+
+def write_table(df, outdir, name, parquet=False):
+    """
+    Write df to <name>.csv in outdir, and also to <name>.parquet if parquet
+    is True (needs pyarrow or fastparquet).
+    """
+    df.to_csv(os.path.join(outdir, name + '.csv'))
+    if parquet:
+        # parquet needs string column names and one type per column
+        flat = df.reset_index()
+        flat.columns = [str(c) for c in flat.columns]
+        for col in flat.columns:
+            if flat[col].dtype == object:
+                flat[col] = flat[col].astype(str)
+        flat.to_parquet(os.path.join(outdir, name + '.parquet'), index=False)
 
 
 def compare_switch_to_eia_production(m):
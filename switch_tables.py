@@ -0,0 +1,139 @@
+"""
+Read Switch input and output tables with explicit column types, keeping a
+binary copy of each table so later runs can skip parsing the .csv file.
+
+read_csv() looks up the schema for the table by file name (see schemas below):
+project, technology and other name columns are read as categoricals, years as
+int16 and fractions as float32. Capacities, costs and other values that get
+added up or compared to targets stay float64. Columns not in the schema use
+the normal pandas types, and integer columns with missing values ('.') are read
+as float64 instead.
+
+The binary copies are pickled DataFrames in cache_dir (.table_cache by
+default), one per source file. A copy is used if the source file has the same
+modification time and size as when it was saved, or failing that, the same
+hash (e.g., after the file was rewritten with the same contents). Set
+cache_dir to None to read the .csv files directly.
+"""
+
+from __future__ import print_function
+import os, hashlib, pickle
+import pandas as pd
+
+# directory holding binary copies of the tables; None to disable
+cache_dir = '.table_cache'
+
+# column types for Switch tables, by file name
+name_columns = dict(
+    GENERATION_PROJECT='category', gen_load_zone='category',
+    gen_tech='category', gen_energy_source='category',
+)
+schemas = {
+    'periods.csv': dict(
+        INVESTMENT_PERIOD='int16', period_start='int16', period_end='float64',
+    ),
+    'generation_projects_info.csv': dict(
+        name_columns,
+        gen_max_age='int16',
+        gen_is_variable='int8', gen_is_baseload='int8', gen_is_cogen='int8',
+        gen_scheduled_outage_rate='float32', gen_forced_outage_rate='float32',
+        gen_storage_efficiency='float32',
+    ),
+    'gen_build_predetermined.csv': dict(
+        GENERATION_PROJECT='category', build_year='int16',
+        gen_predetermined_cap='float64',
+        gen_predetermined_storage_energy_mwh='float64',
+    ),
+    'gen_build_costs.csv': dict(
+        GENERATION_PROJECT='category', build_year='int16',
+        gen_overnight_cost='float64', gen_storage_energy_overnight_cost='float64',
+        gen_fixed_om='float64',
+    ),
+    'BuildGen.csv': dict(
+        GEN_BLD_YRS_1='category', GEN_BLD_YRS_2='int16', BuildGen='float64',
+    ),
+    'BuildStorageEnergy.csv': dict(
+        STORAGE_GEN_BLD_YRS_1='category', STORAGE_GEN_BLD_YRS_2='int16',
+        BuildStorageEnergy='float64',
+    ),
+    'GenFuelUseRate.csv': dict(
+        GEN_TP_FUELS_1='category', GEN_TP_FUELS_3='category',
+        GenFuelUseRate='float64',
+    ),
+    # gen_tech and variable are left as strings in these, because
+    # summarize_results adds rows with new values for them
+    'generation_project_details.csv': dict(
+        generation_project='category', gen_vintage='int16',
+        gen_load_zone='category', gen_energy_source='category',
+        gen_is_intermittent='int8', period='int16', value='float64',
+    ),
+    'non_generation_costs_by_period.csv': dict(
+        period='int16', value='float64',
+    ),
+}
+schemas['gen_build_predetermined_adjusted.csv'] = schemas['gen_build_predetermined.csv']
+
+def read_csv(path, schema=None):
+    """
+    Return the table in the .csv file at path as a DataFrame, using the schema
+    for its file name if none is given, and the cached copy if it's current.
+    """
+    if schema is None:
+        schema = schemas.get(os.path.basename(path), {})
+    if cache_dir is None:
+        return parse(path, schema)
+
+    stat = os.stat(path)
+    cache_path = os.path.join(cache_dir, hashlib.sha1(
+        repr((os.path.abspath(path), sorted(schema.items()))).encode('utf-8')
+    ).hexdigest() + '.pickle')
+    try:
+        with open(cache_path, 'rb') as f:
+            cached = pickle.load(f)
+    except (IOError, OSError, EOFError, pickle.UnpicklingError):
+        cached = None
+    if cached is not None and (cached['mtime'], cached['size']) == (stat.st_mtime, stat.st_size):
+        return cached['table']
+
+    file_hash = hash_file(path)
+    if cached is not None and cached['hash'] == file_hash:
+        table = cached['table']
+    else:
+        table = parse(path, schema)
+    save(cache_path, dict(
+        mtime=stat.st_mtime, size=stat.st_size, hash=file_hash, table=table
+    ))
+    return table
+
+def parse(path, schema):
+    table = pd.read_csv(path, na_values='.')
+    for col, dtype in schema.items():
+        if col not in table.columns:
+            continue
+        if dtype.startswith('int') and table[col].isnull().any():
+            # can't store missing values in integer columns
+            dtype = 'float64'
+        table[col] = table[col].astype(dtype)
+    return table
+
+def hash_file(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def save(cache_path, cached):
+    if not os.path.exists(cache_dir):
+        try:
+            os.makedirs(cache_dir)
+        except OSError:
+            # probably created by another process at the same time
+            if not os.path.isdir(cache_dir):
+                raise
+    # write to a temporary file and then rename, so other processes never
+    # see a partial copy
+    temp_path = '{}.{}.tmp'.format(cache_path, os.getpid())
+    with open(temp_path, 'wb') as f:
+        pickle.dump(cached, f, pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, cache_path)
@@ -0,0 +1,183 @@
+"""
+Keep the dates and weights selected for a time sample fixed from one run to
+the next.
+
+The k-means time samples (e.g., k_means_daily_235_12+_2) are created in the
+database, and re-creating them doesn't select the same dates with the same
+weights each time. So the first time one of these samples is used, its rows in
+study_periods, study_date and study_hour are saved ("pinned") in pin_dir,
+along with a hash of the source rows. Later runs load the pinned rows into
+temporary tables with the same names, which take precedence over the database
+tables while scenario_data.write_tables() runs, so timeseries.csv,
+timepoints.csv and every table that depends on them come out the same as
+before. If the time sample in the database no longer matches the hash, a
+warning is printed and the pinned selection is still used; call
+install(repin_samples=True) (get_scenario_data.py --repin-time-samples) to adopt the
+new selection instead.
+
+Call install() after query_cache.install(), so the query cache and manifest
+can tell pinned time samples apart. Call prepare_pins() in the main process
+before starting parallel builds, so they don't each pin the same samples.
+"""
+
+from __future__ import print_function
+import os, re, pickle, fnmatch
+
+import switch_model.hawaii.scenario_data as scenario_data
+import query_cache
+
+# tables that define a time sample, with columns to sort the rows by
+pinned_tables = [
+    ('study_periods', 'period'),
+    ('study_date', 'study_date'),
+    ('study_hour', 'study_hour'),
+]
+
+# directory holding the pinned time samples
+pin_dir = None
+
+# pattern for names of time samples to pin
+pin_pattern = None
+
+# replace existing pins with the current time sample from the database
+repin = False
+
+# scenario_data.write_tables() before this module was installed
+other_write_tables = None
+
+# time samples already pinned or checked against the database in this process
+checked = set()
+
+def pin_path(time_sample):
+    # make a safe file name (time sample names include characters like +)
+    name = re.sub(r'[^\w.+-]', '_', time_sample)
+    return os.path.join(pin_dir, name + '.pickle')
+
+def source_hash(cur, time_sample):
+    """ Return a hash of the rows defining time_sample in the database. """
+    hashes = []
+    for table, order in pinned_tables:
+        cur.execute(
+            "SELECT md5(string_agg(t::text, ',' ORDER BY t::text)) FROM {} t "
+            "WHERE time_sample = %(time_sample)s;".format(table),
+            dict(time_sample=time_sample)
+        )
+        hashes.append(str(cur.fetchone()[0]))
+    return ':'.join(hashes)
+
+def save_pin(cur, time_sample, path):
+    tables = dict()
+    for table, order in pinned_tables:
+        cur.execute(
+            "SELECT * FROM {} WHERE time_sample = %(time_sample)s ORDER BY {};"
+            .format(table, order),
+            dict(time_sample=time_sample)
+        )
+        tables[table] = ([d[0] for d in cur.description], cur.fetchall())
+    pin = dict(
+        time_sample=time_sample,
+        source_hash=source_hash(cur, time_sample),
+        tables=tables,
+    )
+    # write to a temporary file and then rename, so other processes never
+    # see a partial pin
+    temp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(temp_path, 'wb') as f:
+        pickle.dump(pin, f, pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, path)
+    print("Pinned time sample {} in {}".format(time_sample, path))
+    return pin
+
+def get_pin(time_sample):
+    """
+    Return the pinned rows for time_sample, pinning it first if needed, or
+    None if this time sample isn't pinned.
+    """
+    if pin_dir is None or not fnmatch.fnmatchcase(time_sample, pin_pattern):
+        return None
+    path = pin_path(time_sample)
+    # use the database directly, not the query cache or pinned tables
+    cur = scenario_data.uncached_db_cursor()
+    if repin and time_sample not in checked and os.path.exists(path):
+        os.remove(path)
+    try:
+        with open(path, 'rb') as f:
+            pin = pickle.load(f)
+    except (IOError, OSError, EOFError, pickle.UnpicklingError):
+        pin = save_pin(cur, time_sample, path)
+    else:
+        if time_sample not in checked and source_hash(cur, time_sample) != pin['source_hash']:
+            print(
+                "WARNING: time sample {} has changed in the database since it "
+                "was pinned in {}; using the pinned version (use "
+                "--repin-time-samples to use the new one)."
+                .format(time_sample, path)
+            )
+    checked.add(time_sample)
+    return pin
+
+def prepare_pins(arguments_list):
+    """ Pin or check the time samples used by all the arguments in arguments_list. """
+    for time_sample in sorted(set(a['time_sample'] for a in arguments_list)):
+        get_pin(time_sample)
+
+def load_pin(pin):
+    """
+    Create temporary tables holding the pinned rows, which hide the database
+    tables with the same names.
+    """
+    cur = scenario_data.db_cursor()
+    for table, order in pinned_tables:
+        columns, rows = pin['tables'][table]
+        placeholders = '(' + ','.join(['%s'] * len(columns)) + ')'
+        # note: CachingCursor fingerprints the new table after this runs, so
+        # the query cache and manifest keys reflect the pinned rows
+        query = (
+            "DROP TABLE IF EXISTS pg_temp.{table}; "
+            "CREATE TEMPORARY TABLE {table} AS SELECT * FROM {table} WHERE false;"
+        ).format(table=table)
+        if rows:
+            query += " INSERT INTO {} ({}) VALUES {};".format(
+                table,
+                ', '.join('"{}"'.format(c) for c in columns),
+                ', '.join(cur.mogrify(placeholders, r).decode('utf-8') for r in rows)
+            )
+        cur.execute(query)
+
+def unload_pin():
+    """ Drop the temporary tables, so the database tables are visible again. """
+    cur = scenario_data.db_cursor()
+    for table, order in pinned_tables:
+        cur.execute("DROP TABLE IF EXISTS pg_temp.{};".format(table))
+        query_cache.temp_table_fingerprints.pop(table, None)
+
+def write_tables(args):
+    pin = get_pin(args['time_sample'])
+    if pin is None:
+        other_write_tables(args)
+        return
+    load_pin(pin)
+    try:
+        other_write_tables(args)
+    finally:
+        unload_pin()
+
+def install(directory, pattern='k_means*', repin_samples=False):
+    """
+    Make scenario_data use pinned versions of time samples whose names match
+    pattern (a shell-style wildcard), stored in directory.
+    """
+    global pin_dir, pin_pattern, repin, other_write_tables
+    pin_dir = directory
+    pin_pattern = pattern
+    repin = repin_samples
+    if not os.path.exists(pin_dir):
+        try:
+            os.makedirs(pin_dir)
+        except OSError:
+            # probably created by another process at the same time
+            if not os.path.isdir(pin_dir):
+                raise
+    if other_write_tables is None:
+        other_write_tables = scenario_data.write_tables
+    scenario_data.write_tables = write_tables